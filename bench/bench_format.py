@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmarks of ``kids.data.format`` formatters
+
+Run it from the source tree with::
+
+    $ PYTHONPATH=src python bench/bench_format.py
+
+Each line gives the time per call in micro-seconds.
+
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from kids.data.format import Formatter, LogNumberFormatter, \
+     TimeStampFormatter, FancyNumberFormatter
+
+
+class NewAPI(Formatter):
+
+    def format(self, value, context=None):
+        return value
+
+
+class OldAPI(Formatter):
+
+    def format(self, value):
+        return value
+
+
+def bench(label, stmt, number=100000, repeat=5):
+    best = min(timeit.repeat(stmt, number=number, repeat=repeat))
+    print("%-40s %8.3f us/call" % (label, best / number * 10 ** 6))
+
+
+def main():
+    new, old = NewAPI(), OldAPI()
+    bench("NewAPI.format (direct)", lambda: new.format(1, new.context))
+    bench("NewAPI.__call__", lambda: new(1))
+    bench("NewAPI.__call__ (kwargs)", lambda: new(1, data='foo'))
+    bench("OldAPI.format (direct)", lambda: old.format(1))
+    bench("OldAPI.__call__", lambda: old(1))
+    chain = new | new | old | new
+    bench("4 stages chain", lambda: chain(1))
+    bench("4 stages chain (kwargs)", lambda: chain(1, data='foo'))
+    size = LogNumberFormatter(
+        units=(["B", "KiB", "MiB", "GiB", "TiB"], 2 ** 10))
+    bench("LogNumberFormatter", lambda: size(123456789))
+    column = list(range(0, 2 ** 40, 2 ** 30))
+    bench("LogNumberFormatter.format_many (1024 values)",
+          lambda: size.format_many(column), number=100)
+    window = (1226909090, 1226959090)
+    timestamp = TimeStampFormatter(structure=((0, 2), (1, 4), (3, 5)),
+                                   timeframe=window)
+    bench("TimeStampFormatter", lambda: timestamp(1226919090))
+    column = list(range(window[0], window[1], 50))
+    bench("TimeStampFormatter.format_many (1000 values)",
+          lambda: timestamp.format_many(column), number=100)
+    timedelta = FancyNumberFormatter(structure=(
+        (10 ** 3, 1, (u'< 1 ms', {})),
+        (10 ** 3, 10 ** 3, (u'%(value)d ms', {'value': 1})),
+        (60, 10 ** 3, (u'%(value).1f s', {'value': 1})),
+        (60, 1, (u'%(value_1)d m %(value_2)d s',
+                 {'value_1': 60, 'value_2': 1})),
+        (24, 60, (u'%(value_1)d h %(value_2)d m',
+                  {'value_1': 60, 'value_2': 1})),
+        (None, 60, (u'%(value_1)d d %(value_2)d h',
+                    {'value_1': 24, 'value_2': 1})),
+    ))
+    bench("FancyNumberFormatter", lambda: timedelta(2500 * 10 ** 6))
+    column = list(range(0, 10 ** 12, 10 ** 9))
+    bench("FancyNumberFormatter.format_many (1000 values)",
+          lambda: timedelta.format_many(column), number=100)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Import time of ``kids.data`` and its modules
+
+Run it from the source tree with::
+
+    $ PYTHONPATH=src python bench/bench_import.py
+
+Each import is done in a fresh interpreter, each line gives the best
+time in milli-seconds (interpreter startup excluded) and the heavy
+dependencies that were loaded. The ``kids`` namespace package is imported
+beforehand, as its ``pkg_resources`` declaration is timed separately.
+
+"""
+
+from __future__ import print_function
+
+import sys
+import subprocess
+
+
+HEAVY = ("kids.txt", "kids.cache", "sact.epoch")
+
+SCRIPT = """
+import sys, time
+%s
+start = time.time()
+import %s
+elapsed = time.time() - start
+print("%%f %%s" %% (elapsed, ",".join(
+    m for m in %r if m in sys.modules)))
+"""
+
+
+def bench(module, repeat=10, setup="import kids"):
+    results = []
+    for _ in range(repeat):
+        out = subprocess.check_output(
+            [sys.executable, "-c", SCRIPT % (setup, module, HEAVY)])
+        elapsed, loaded = (out.decode().strip().split(" ") + [""])[:2]
+        results.append((float(elapsed), loaded))
+    best, loaded = min(results)
+    print("%-30s %8.3f ms  %s" % ("import " + module, best * 10 ** 3,
+                                 loaded or "-"))
+
+
+def main():
+    bench("kids", setup="")
+    for module in ("kids.data", "kids.data.lib", "kids.data.mdict",
+                   "kids.data.dct", "kids.data.graph", "kids.data.format",
+                   "kids.data.fmt"):
+        bench(module)
+
+
+if __name__ == "__main__":
+    main()
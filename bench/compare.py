@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Compares two result files of ``bench/suite.py``
+
+    $ python bench/compare.py before.json after.json [--threshold 1.2]
+
+Prints the ratio of best times (after / before) of each benchmark
+found in both files, and exits with status 1 if any ratio is above
+``threshold``.
+
+"""
+
+from __future__ import print_function
+
+import sys
+import json
+import argparse
+
+
+def key(result):
+    return (result["group"], result["name"],
+            tuple(sorted(result["params"].items())))
+
+
+def load(filename):
+    with open(filename) as f:
+        doc = json.load(f)
+    return doc["meta"], dict((key(r), r) for r in doc["results"])
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="ratio above which it is a regression")
+    opts = parser.parse_args(args)
+
+    meta_before, before = load(opts.before)
+    meta_after, after = load(opts.after)
+    print("before: %(commit)s (python %(python)s)" % meta_before)
+    print("after:  %(commit)s (python %(python)s)" % meta_after)
+    regressions = 0
+    for k in sorted(set(before) & set(after)):
+        ratio = after[k]["best"] / before[k]["best"]
+        flag = ""
+        if ratio > opts.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print("%-70s %6.2fx%s" % (
+            "%s.%s(%s)" % (k[0], k[1], ", ".join("%s=%s" % p for p in k[2])),
+            ratio, flag))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
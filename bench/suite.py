@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite of ``kids.data`` hot paths
+
+Run it from the source tree with::
+
+    $ PYTHONPATH=src python bench/suite.py -o results.json
+
+Data is generated deterministically (see ``synthetic.py``), so that
+results of two commits can be compared with ``bench/compare.py``. The
+largest sizes are only run with ``--full``, and ``--filter`` selects
+benchmarks by name.
+
+Results are written as JSON: a ``meta`` object describing the run, and
+a ``results`` list giving for each benchmark its ``group``, ``name``,
+``params`` and the ``best`` and ``median`` time per call in seconds.
+
+"""
+
+from __future__ import print_function
+
+import re
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import itertools
+import subprocess
+
+import synthetic
+
+from kids.data import mdict, dct, graph, match, fmt, format, mapped, trie, \
+    fingerprint
+
+
+BENCHMARKS = []
+
+
+def benchmark(group, full={}, **params):
+    """Registers a setup function for each combination of ``params``
+
+    The setup function returns the callable to time. Combinations of
+    ``full`` values are only run on full runs.
+
+    """
+    def register(setup):
+        for values, is_full in ((params, False), (full, True)):
+            if not values:
+                continue
+            values = dict(params, **values)
+            names = sorted(values)
+            for combination in itertools.product(
+                    *[values[name] for name in names]):
+                BENCHMARKS.append({
+                    "group": group, "name": setup.__name__,
+                    "params": dict(zip(names, combination)),
+                    "setup": setup, "full": is_full})
+        return setup
+    return register
+
+
+##
+## mdict
+##
+
+@benchmark("mdict", depth=(1, 4, 16), key_len=(4, 32))
+def mget(depth, key_len):
+    data, tokens = synthetic.deep_path(depth, key_len)
+    key = ".".join(tokens)
+    return lambda: mdict.mget(data, key)
+
+
+@benchmark("mdict", depth=(1, 4, 16), key_len=(4, 32))
+def mset(depth, key_len):
+    data, tokens = synthetic.deep_path(depth, key_len)
+    key = ".".join(tokens)
+    return lambda: mdict.mset(data, key, 2)
+
+
+@benchmark("mdict", depth=(1, 4, 16), key_len=(4, 32))
+def mdel_mset(depth, key_len):
+    data, tokens = synthetic.deep_path(depth, key_len)
+    key = ".".join(tokens)
+
+    def run():
+        mdict.mdel(data, key)
+        mdict.mset(data, key, 1)
+    return run
+
+
+@benchmark("mdict", leaves=(10 ** 3, 10 ** 4), method=("mset", "mset_many"))
+def set_many(leaves, method):
+    items = sorted(mdict.deflate(synthetic.nested_dict(leaves)).items())
+    if method == "mset":
+        def run():
+            dct = {}
+            for key, value in items:
+                mdict.mset(dct, key, value)
+        return run
+    return lambda: mdict.mset_many({}, items)
+
+
+@benchmark("mdict", depth=(1, 4, 16), method=("mget", "compile_path"))
+def get_path(depth, method):
+    data, tokens = synthetic.deep_path(depth)
+    key = ".".join(tokens)
+    if method == "mget":
+        return lambda: mdict.mget(data, key)
+    get = mdict.compile_path(key)
+    return lambda: get(data)
+
+
+@benchmark("mdict", depth=(1, 4, 16))
+def mdict_getitem(depth):
+    data, tokens = synthetic.deep_path(depth)
+    m, key = mdict.mdict(data), ".".join(tokens[:-1]) or tokens[0]
+    return lambda: m[key]
+
+
+@benchmark("mdict", leaves=(10 ** 3, 10 ** 4, 10 ** 5), full={
+    "leaves": (10 ** 6, )})
+def deflate(leaves):
+    data = synthetic.nested_dict(leaves)
+    return lambda: mdict.deflate(data)
+
+
+@benchmark("mdict", leaves=(10 ** 3, 10 ** 4, 10 ** 5), full={
+    "leaves": (10 ** 6, )})
+def inflate(leaves):
+    flat = mdict.deflate(synthetic.nested_dict(leaves))
+    return lambda: mdict.inflate(flat)
+
+
+@benchmark("mdict", leaves=(10 ** 3, 10 ** 5))
+def mapped_getitem(leaves):
+    data = synthetic.nested_dict(leaves)
+    table = mapped.loads(mapped.dumps(data))
+    key = sorted(mdict.deflate(data))[leaves // 2]
+    return lambda: table[key]
+
+
+@benchmark("mdict", services=(100, 5000), method=("mget", "mselect"))
+def select(services, method):
+    data = {"services": dict(("s%d" % i, {"port": i, "host": "h%d" % i})
+                             for i in range(services))}
+    if method == "mselect":
+        return lambda: list(mdict.mselect(data, "services.*.port"))
+    return lambda: [(name, mdict.mget(data, "services.%s.port" % name))
+                    for name in data["services"]]
+
+
+@benchmark("mdict", leaves=(10 ** 3, 10 ** 5), mutate=(False, True),
+           tracked=(False, True))
+def flat(leaves, mutate, tracked):
+    m = mdict.mdict(synthetic.nested_dict(leaves),
+                    fingerprints=fingerprint.Fingerprints() if tracked
+                    else None)
+    key = sorted(m.flat)[leaves // 2]
+    counter = itertools.count()
+
+    def run():
+        if mutate:
+            m[key] = next(counter)
+        return m.flat
+    return run
+
+
+@benchmark("mdict", leaves=(10 ** 3, 10 ** 5), method=("deflate", "mdiff"))
+def diff(leaves, method):
+    old = synthetic.nested_dict(leaves)
+    key = sorted(mdict.deflate(old))[leaves // 2]
+    new = dict(old)
+    tokens = key.split(".")
+    dct = new
+    for token in tokens[:-1]:  ## copy only the path to the changed leaf
+        dct[token] = dict(dct[token])
+        dct = dct[token]
+    dct[tokens[-1]] = "changed"
+    if method == "deflate":
+        def run():
+            a, b = mdict.deflate(old), mdict.deflate(new)
+            return [k for k in set(a) | set(b) if a.get(k) != b.get(k)]
+        return run
+    return lambda: list(mdict.mdiff(old, new))
+
+
+@benchmark("mdict", leaves=(10 ** 3, 10 ** 5), query=("count", "items"))
+def trie_prefix(leaves, query):
+    flat = mdict.deflate(synthetic.nested_dict(leaves))
+    index = trie.Trie(flat.items())
+    prefix = sorted(flat)[leaves // 2].rsplit(".", 1)[0] + "."
+    if query == "count":
+        return lambda: index.count(prefix)
+    return lambda: list(index.items(prefix))
+
+
+##
+## dct
+##
+
+@benchmark("dct", layers=(1, 4, 16), access=("key", "section", "keys"))
+def multi_dict_reader(layers, access):
+    reader = dct.MultiDictReader(synthetic.layers(layers))
+    last = "layer%d" % (layers - 1)
+    return {
+        "key": lambda: reader[last],
+        "section": lambda: reader["section"].keys(),
+        "keys": lambda: reader.keys(),
+    }[access]
+
+
+##
+## graph
+##
+
+@benchmark("graph", nodes=(100, 1000))
+def reorder(nodes):
+    elts, deps = synthetic.dag(nodes)
+    return lambda: graph.reorder(list(elts), deps)
+
+
+@benchmark("graph", nodes=(100, 1000))
+def cycle_exists(nodes):
+    elts, deps = synthetic.dag(nodes)
+    return lambda: graph.cycle_exists(nodes - 1, deps)
+
+
+##
+## match
+##
+
+@benchmark("match", size=(10 ** 3, 10 ** 4), criteria=("size_equal",
+           "levenstein"), cache=("cold", "warm"))
+def close_matches(size, criteria, cache):
+    if criteria == "levenstein" and match.distance is None:
+        return None
+    targets = synthetic.catalog(size)
+    criteria = match.avg({
+        "size_equal": [match.size, match.equal],
+        "levenstein": [match.levenstein, match.size],
+    }[criteria])
+
+    def run():
+        if cache == "cold":
+            match.match.cache_clear()
+        return match.close_matches("foobar", targets, criteria, 0.5)
+    match.match.cache_clear()
+    run()
+    return run
+
+
+##
+## format
+##
+
+FORMATTERS = {
+    "mk_fmt": lambda: format.mk_fmt(lambda v, c: v)(),
+    "Chain": lambda: format.Chain([format.mk_fmt(lambda v, c: v + 1)(),
+                                   format.PercentFormatter(),
+                                   format.mk_fmt(lambda v, c: v)()]),
+    "TimeStampFormatter": lambda: format.TimeStampFormatter(
+        structure=((0, 2), (1, 4), (3, 5)),
+        timeframe=(1226909090, 1226909090 + 10 ** 6)),
+    "FancyNumberFormatter": lambda: format.FancyNumberFormatter(structure=(
+        (10 ** 3, 1, (u'< 1 ms', {})),
+        (10 ** 3, 10 ** 3, (u'%(value)d ms', {'value': 1})),
+        (60, 10 ** 3, (u'%(value).1f s', {'value': 1})),
+        (60, 1, (u'%(value_1)d m %(value_2)d s',
+                 {'value_1': 60, 'value_2': 1})),
+        (None, 60, (u'%(value_1)d h %(value_2)d m',
+                    {'value_1': 60, 'value_2': 1})),
+    )),
+    "LogNumberFormatter": lambda: fmt.size,
+    "PercentFormatter": lambda: format.PercentFormatter(),
+}
+
+
+@benchmark("format", formatter=sorted(FORMATTERS),
+           mode=("call", "format_many"))
+def formatter(formatter, mode):
+    f = FORMATTERS[formatter]()
+    values = list(range(1226909090, 1226909090 + 10 ** 6, 1000)) \
+             if formatter == "TimeStampFormatter" else \
+             list(range(0, 10 ** 9, 10 ** 6))
+    if mode == "call":
+        value = values[len(values) // 2]
+        return lambda: f(value)
+    return lambda: f.format_many(values)
+
+
+##
+## fmt
+##
+
+SHAPES = {
+    "tall": (10 ** 4, 4),
+    "wide": (100, 50),
+}
+
+
+@benchmark("fmt", shape=sorted(SHAPES),
+           mode=("records", "columns", "group_by", "live"))
+def records(shape, mode):
+    rows, nb_fields = SHAPES[shape]
+    fields, elts = synthetic.records(rows, nb_fields)
+    if mode == "records":
+        return lambda: fmt.records(elts, fields)
+    if mode == "columns":
+        cols = dict((f, [elt[f] for elt in elts]) for f in fields)
+        return lambda: fmt.records(cols, fields)
+    if mode == "group_by":
+        return lambda: fmt.records(elts, fields, group_by=[fields[3]],
+                                   totals={fields[0]: sum})
+    live = fmt.LiveRecords(fields)
+    live.update(elts)
+    counter = itertools.count()
+
+    def run():
+        elts[0] = dict(elts[0], f0=next(counter))
+        return live.update(elts)
+    return run
+
+
+##
+## Runner
+##
+
+def measure(fun, repeat=5, min_time=0.1):
+    """Returns best and median time per call of ``fun``"""
+    number = 1
+    while True:
+        elapsed = timeit.timeit(fun, number=number)
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed > min_time / 10 else 10
+    times = [elapsed] + timeit.repeat(fun, number=number, repeat=repeat - 1)
+    times = sorted(t / number for t in times)
+    return {"number": number, "repeat": repeat,
+            "best": times[0], "median": times[len(times) // 2]}
+
+
+def meta():
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            stderr=subprocess.STDOUT).decode().strip()
+    except Exception:  ## pylint: disable-msg=W0703
+        commit = None
+    return {"commit": commit,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def label(bench):
+    return "%s.%s(%s)" % (
+        bench["group"], bench["name"],
+        ", ".join("%s=%s" % (k, v)
+                  for k, v in sorted(bench["params"].items())))
+
+
+def run(full=False, pattern=None, repeat=5, min_time=0.1):
+    results = []
+    for bench in BENCHMARKS:
+        if bench["full"] and not full:
+            continue
+        if pattern and not re.search(pattern, label(bench)):
+            continue
+        fun = bench["setup"](**bench["params"])
+        if fun is None:  ## not available
+            continue
+        result = dict(group=bench["group"], name=bench["name"],
+                      params=bench["params"])
+        result.update(measure(fun, repeat, min_time))
+        print("%-70s %12.3f us" % (label(bench), result["best"] * 10 ** 6),
+              file=sys.stderr)
+        results.append(result)
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-o", "--output", help="JSON file (default: stdout)")
+    parser.add_argument("--full", action="store_true",
+                        help="include largest sizes")
+    parser.add_argument("--filter", help="regex on benchmark labels")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.1,
+                        help="minimum seconds of each timing")
+    opts = parser.parse_args(args)
+    doc = {"meta": meta(),
+           "results": run(opts.full, opts.filter, opts.repeat,
+                          opts.min_time)}
+    if opts.output:
+        with open(opts.output, "w") as f:
+            json.dump(doc, f, indent=1, sort_keys=True)
+    else:
+        json.dump(doc, sys.stdout, indent=1, sort_keys=True)
+        print()
+
+
+if __name__ == "__main__":
+    main()
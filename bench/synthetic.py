@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Deterministic synthetic data for benchmarks
+
+All generators take a ``seed`` and return the same data for the same
+arguments, on all platforms.
+
+"""
+
+import random
+import string
+
+
+def word(rng, length):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def nested_dict(leaves, depth=3, key_len=6, seed=0):
+    """Returns a recursive dict of ``leaves`` values at given ``depth``
+
+    Each section has about the same number of sub keys.
+
+    """
+    rng = random.Random(seed)
+    pool = [word(rng, key_len) for _ in range(256)]
+    fanout = max(2, int(round(leaves ** (1. / depth))))
+    dct = {}
+    for i in range(leaves):
+        section = dct
+        for level in range(depth - 1):
+            j = i // fanout ** (depth - 1 - level)
+            section = section.setdefault(
+                "%s%d" % (pool[j % len(pool)], j), {})
+        section["%s%d" % (rng.choice(pool), i)] = i
+    return dct
+
+
+def deep_path(depth, key_len=6, seed=0):
+    """Returns a dict holding one value at ``depth``, and its tokens"""
+    rng = random.Random(seed)
+    tokens = [word(rng, key_len) for _ in range(depth)]
+    dct = value = {}
+    for token in tokens[:-1]:
+        value[token] = {}
+        value = value[token]
+    value[tokens[-1]] = 1
+    return dct, tokens
+
+
+def layers(nb, keys=100, seed=0):
+    """Returns ``nb`` dicts sharing some keys and sections"""
+    rng = random.Random(seed)
+    dcts = []
+    for i in range(nb):
+        dct = dict(("key%d" % rng.randrange(keys * 2), i)
+                   for _ in range(keys))
+        dct["section"] = dict(("sub%d" % rng.randrange(keys), i)
+                              for _ in range(keys // 10 + 1))
+        dct["layer%d" % i] = i
+        dcts.append(dct)
+    return dcts
+
+
+def dag(nodes, deps=3, seed=0):
+    """Returns shuffled nodes of a random DAG and its dependency function"""
+    rng = random.Random(seed)
+    graph = dict((n, rng.sample(range(n), min(n, rng.randint(1, deps))))
+                 for n in range(nodes))
+    elts = list(graph)
+    rng.shuffle(elts)
+    return elts, graph.__getitem__
+
+
+def catalog(size, min_len=3, max_len=12, seed=0):
+    """Returns ``size`` random words"""
+    rng = random.Random(seed)
+    return [word(rng, rng.randint(min_len, max_len)) for _ in range(size)]
+
+
+def records(rows, fields=4, seed=0):
+    """Returns ``rows`` records of ``fields`` fields of various types"""
+    rng = random.Random(seed)
+    kinds = [i % 4 for i in range(fields)]
+    names = ["f%d" % i for i in range(fields)]
+    elts = []
+    for _ in range(rows):
+        elt = {}
+        for name, kind in zip(names, kinds):
+            if kind == 0:
+                elt[name] = rng.randrange(10 ** 6)
+            elif kind == 1:
+                elt[name] = word(rng, rng.randint(1, 12))
+            elif kind == 2:
+                elt[name] = rng.random() * 1000
+            else:
+                elt[name] = rng.choice(["x", "y", "z"])
+        elts.append(elt)
+    return names, elts
@@ -1,8 +1,40 @@
 # -*- coding: utf-8 -*-
 
-from . import dsp
-from . import fmt
-from . import lib
-from . import mdict
-from . import graph
-from . import dct
+import sys
+
+
+## Submodules are imported on first access, as some of them pull
+## heavier dependencies (``kids.txt``, ``sact.epoch``...).
+_SUBMODULES = ("dsp", "fmt", "format", "lib", "match", "mdict", "graph",
+               "dct", "stats", "mapped", "codec", "trie", "fingerprint")
+
+
+if sys.version_info >= (3, 7):
+
+    import importlib
+
+    def __getattr__(name):
+        if name in _SUBMODULES:
+            return importlib.import_module("." + name, __name__)
+        raise AttributeError("module %r has no attribute %r"
+                             % (__name__, name))
+
+    def __dir__():
+        return sorted(set(globals()) | set(_SUBMODULES))
+
+else:  ## pragma: no cover
+
+    ## No module ``__getattr__`` (PEP 562) before python 3.7
+    from . import dsp
+    from . import fmt
+    from . import format
+    from . import lib
+    from . import match
+    from . import mdict
+    from . import graph
+    from . import dct
+    from . import stats
+    from . import mapped
+    from . import codec
+    from . import trie
+    from . import fingerprint
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Compact binary serialization of nested dicts
+
+Nested dicts are serialized as their flat (key, value) pairs given by
+``unclassify``, the same as ``deflate``:
+
+    >>> from pprint import pprint as pp
+    >>> from kids.data.codec import encode, decode
+    >>> dct = {'services': {'web': {'port': 80, 'host': u'localhost'},
+    ...                     'db': {'port': 5432, 'debug': False}}}
+    >>> buf = encode(dct)
+    >>> pp(decode(buf))
+    {'services': {'db': {'debug': False, 'port': 5432},
+                  'web': {'host': 'localhost', 'port': 80}}}
+
+Keys are sorted and only store the part they don't share with the
+previous key, and values are typed (``None``, booleans, integers,
+floats, strings), other values being stored as JSON:
+
+    >>> import json
+    >>> len(buf), len(json.dumps(dct))
+    (65, 94)
+
+"""
+
+import json
+import struct
+
+from .mdict import unclassify, classify, mk_join_fun, mk_sep_fun
+
+
+## Python 3 compatibility layer
+try:
+    unicode = unicode
+except NameError:  ## pragma: no cover
+    # 'unicode' is undefined, must be Python 3
+    unicode = str
+    bytes = bytes
+    long = int
+else:  ## pragma: no cover
+    # 'unicode' exists, must be Python 2
+    bytes = str
+    long = long
+
+
+MAGIC = b"KDC1"
+
+_DOUBLE = struct.Struct("<d")
+
+_BYTES = [bytes(bytearray((n, ))) for n in range(0x80)]
+
+
+def _varint(n):
+    """Returns little-endian base 128 encoding of positive integer ``n``
+
+        >>> bytes(_varint(1)), bytes(_varint(300))
+        (b'\\x01', b'\\xac\\x02')
+
+    """
+    if n < 0x80:
+        return _BYTES[n]
+    res = bytearray()
+    while n >= 0x80:
+        res.append((n & 0x7f) | 0x80)
+        n >>= 7
+    res.append(n)
+    return res
+
+
+def _read_varint(buf, i):
+    """Returns integer encoded at ``i`` in ``buf`` and the next index"""
+    byte = buf[i]
+    if byte < 0x80:
+        return byte, i + 1
+    n, shift = 0, 0
+    while byte >= 0x80:
+        n |= (byte & 0x7f) << shift
+        shift += 7
+        i += 1
+        byte = buf[i]
+    return n | (byte << shift), i + 1
+
+
+def _encode_value(value, out):
+    if value is None:
+        out += b"n"
+    elif value is True or value is False:
+        out += b"t" if value else b"f"
+    elif isinstance(value, (int, long)):
+        out += b"i"
+        out += _varint(value << 1 if value >= 0 else ((-value) << 1) - 1)
+    elif isinstance(value, float):
+        out += b"r"
+        out += _DOUBLE.pack(value)
+    else:
+        if isinstance(value, unicode):
+            out += b"s"
+            data = value.encode("utf-8")
+        else:
+            out += b"j"
+            data = json.dumps(value, sort_keys=True).encode("utf-8")
+        out += _varint(len(data))
+        out += data
+
+
+def _shared_size(a, b):
+    """Returns size of the common prefix of ``a`` and ``b``
+
+        >>> _shared_size(b"abcd", b"abxd"), _shared_size(b"ab", b"abc")
+        (2, 2)
+
+    """
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:  ## binary search, comparing slices is fast
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def encode(dct, sep=".", deep=-1):
+    """Returns bytes of nested dict ``dct``
+
+    ``sep`` and ``deep`` are those of ``deflate``.
+
+    """
+    out = bytearray(MAGIC)
+    data = sep.encode("utf-8")
+    out += _varint(len(data))
+    out += data
+    previous = b""
+    for key, value in sorted(
+            (k.encode("utf-8"), v)
+            for k, v in unclassify(dct, join_fun=mk_join_fun(sep),
+                                   deep=deep)):
+        shared = _shared_size(key, previous)
+        out += _varint(shared)
+        out += _varint(len(key) - shared)
+        out += key[shared:]
+        _encode_value(value, out)
+        previous = key
+    return bytes(out)
+
+
+def iter_decode(buf):
+    """Yields the (flat key, value) pairs stored in ``buf``
+
+        >>> list(iter_decode(encode({'a': {'b': 1, 'c': [1.5]}})))
+        [('a.b', 1), ('a.c', [1.5])]
+
+    """
+    if not isinstance(buf, bytearray):
+        buf = bytearray(buf)  ## items are integers also on PY2
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a kids.data encoded dict.")
+    size, i = _read_varint(buf, len(MAGIC))
+    i += size
+    end = len(buf)
+    key = b""
+    while i < end:
+        shared, i = _read_varint(buf, i)
+        size, i = _read_varint(buf, i)
+        key = key[:shared] + bytes(buf[i:i + size])
+        i += size
+        code = buf[i]
+        i += 1
+        if code == 0x73:  ## s
+            size, i = _read_varint(buf, i)
+            value = buf[i:i + size].decode("utf-8")
+            i += size
+        elif code == 0x69:  ## i
+            n, i = _read_varint(buf, i)
+            value = -((n + 1) >> 1) if n & 1 else n >> 1
+        elif code == 0x72:  ## r
+            value = _DOUBLE.unpack_from(buf, i)[0]
+            i += 8
+        elif code == 0x6e:  ## n
+            value = None
+        elif code in (0x74, 0x66):  ## t, f
+            value = code == 0x74
+        elif code == 0x6a:  ## j
+            size, i = _read_varint(buf, i)
+            value = json.loads(buf[i:i + size].decode("utf-8"))
+            i += size
+        else:
+            raise ValueError("Unknown value type %r at %d." % (code, i - 1))
+        yield key.decode("utf-8"), value
+
+
+def decode(buf, deep=-1):
+    """Returns nested dict stored in ``buf``
+
+    Pairs are decoded as they are classified:
+
+        >>> decode(encode({'a.b': {'c': None}}))
+        {'a.b': {'c': None}}
+
+    """
+    buf = bytearray(buf)
+    size, i = _read_varint(buf, len(MAGIC))
+    sep = buf[i:i + size].decode("utf-8")
+    return classify(iter_decode(buf), sep_fun=mk_sep_fun(sep), deep=deep)
@@ -3,6 +3,8 @@
 import copy
 from itertools import chain
 
+from . import stats
+
 
 def merge(*args):
     """Merging n dicts into one.
@@ -15,6 +17,8 @@ def merge(*args):
 
 def is_dict_like(obj):
     """Try to figure if the given obj gives a dict-like interface"""
+    if stats.enabled:
+        stats.incr("dct.is_dict_like")
     return all(hasattr(obj, method_name)
                for method_name in ["__getitem__", "__iter__", "get", "keys"])
 
@@ -27,6 +31,8 @@ class DictLikeAbstract(object):
 
     """
 
+    __slots__ = ()
+
     def __iter__(self):
         raise NotImplementedError()
 
@@ -164,6 +170,8 @@ class MultiDictReader(AttrDictAbstract):
         results_nb = []
         # import pdb; pdb.set_trace()
         for i, dct in enumerate(self._dcts):
+            if stats.enabled:
+                stats.incr("dct.multi_dict_reader.layers")
             try:
                 res = dct.__getitem__(label)
             except KeyError:
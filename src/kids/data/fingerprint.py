@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Content fingerprints of nested dicts and lists
+
+A fingerprint only depends on content, and is the same from one process
+to another:
+
+    >>> from kids.data.fingerprint import fingerprint
+    >>> fingerprint({'a': [1, 2], 'b': {'c': None}})
+    'f510f8738cf41912538ccd0e3a2f70988fc59610'
+    >>> fingerprint({'b': {'c': None}, 'a': [1, 2]}) == \\
+    ...     fingerprint({'a': [1, 2], 'b': {'c': None}})
+    True
+    >>> fingerprint({'a': 1}) == fingerprint({'a': '1'})
+    False
+
+Fingerprints of dicts and lists are computed from those of their
+children (as a Merkle tree), so ``Fingerprints`` caches them per node,
+and once a node is changed, only the nodes of its path need to be
+invalidated.
+
+Leaves are identified by their type name and ``repr``.
+
+"""
+
+import hashlib
+
+from . import stats
+from .dct import is_dict_like
+
+
+def _leaf_digest(value):
+    return hashlib.sha1(("%s:%r" % (type(value).__name__, value))
+                        .encode("utf-8")).digest()
+
+
+class Fingerprints(object):
+    """Cache of fingerprints of the dicts and lists of nested structures
+
+        >>> fingerprints = Fingerprints()
+        >>> dct = {'a': {'b': 1}, 'c': {'d': 2}}
+        >>> before = fingerprints(dct)
+        >>> dct['a']['b'] = 3
+        >>> fingerprints(dct) == before  ## not invalidated
+        True
+        >>> fingerprints.invalidate(dct, dct['a'])
+        >>> fingerprints(dct) == before
+        False
+
+    Only the invalidated nodes were computed again, ``dct['c']`` being
+    still in cache.
+
+    """
+
+    __slots__ = ("_cache", )
+
+    def __init__(self):
+        self._cache = {}  ## id -> (node, digest)
+
+    def digest(self, value):
+        """Returns fingerprint of ``value`` as bytes"""
+        is_list = isinstance(value, list)
+        if not is_list and not (type(value) is dict or is_dict_like(value)):
+            return _leaf_digest(value)
+        ## holding ``value`` in the cache ensures its id is not reused
+        cached = self._cache.get(id(value))
+        if cached is not None and cached[0] is value:
+            if stats.enabled:
+                stats.incr("fingerprint.hits")
+            return cached[1]
+        if stats.enabled:
+            stats.incr("fingerprint.misses")
+        if is_list:
+            h = hashlib.sha1(b"l")
+            for child in value:
+                h.update(self.digest(child))
+        else:
+            h = hashlib.sha1(b"d")
+            for pair in sorted(_leaf_digest(k) + self.digest(v)
+                               for k, v in value.items()):
+                h.update(pair)
+        digest = h.digest()
+        self._cache[id(value)] = (value, digest)
+        return digest
+
+    def __call__(self, value):
+        """Returns fingerprint of ``value`` as an hexadecimal string"""
+        digest = self.digest(value)
+        if isinstance(digest, str):  ## pragma: no cover
+            return digest.encode("hex")  ## PY2
+        return digest.hex()
+
+    def invalidate(self, *nodes):
+        """Forgets fingerprints of ``nodes``, as they were changed"""
+        for node in nodes:
+            self._cache.pop(id(node), None)
+
+    def forget(self, value):
+        """Forgets fingerprints of ``value`` and of all its sub nodes
+
+        To be used on values removed from a structure, that would
+        otherwise be kept in memory by the cache:
+
+            >>> fingerprints = Fingerprints()
+            >>> dct = {'a': {'b': [{}]}}
+            >>> _ = fingerprints(dct)
+            >>> len(fingerprints)
+            4
+            >>> fingerprints.forget(dct.pop('a'))
+            >>> len(fingerprints)
+            1
+
+        """
+        todo = [value]
+        while todo:
+            value = todo.pop()
+            if isinstance(value, list):
+                todo.extend(value)
+            elif type(value) is dict or is_dict_like(value):
+                todo.extend(value.values())
+            else:
+                continue
+            self._cache.pop(id(value), None)
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+def fingerprint(value):
+    """Returns fingerprint of ``value`` as an hexadecimal string"""
+    return Fingerprints()(value)
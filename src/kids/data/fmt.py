@@ -1,11 +1,23 @@
 # -*- coding: utf-8 -*-
 
 import re
+import array
+import itertools
+import unicodedata
+
+try:
+    from collections.abc import Mapping
+except ImportError:  ## pragma: no cover
+    from collections import Mapping  ## PY2
+
+try:
+    from functools import lru_cache
+except ImportError:  ## pragma: no cover
+    lru_cache = None  ## PY2: widths are not cached
 
 import kids.txt as txt
 
-from .format import LogNumberFormatter, mk_fmt
-from .lib import partition
+from .format import LogNumberFormatter, mk_fmt, _numpy_of
 
 
 ## Python 3 compatibility layer
@@ -39,20 +51,78 @@ cond = lambda predicate, fmt_true, fmt_false: mk_fmt(
 fun_id = unicode
 
 
+_ANSI = re.compile(r'\x1b[^m]*m')
+_TRAILING_WHITESPACES = re.compile(r' +$', re.MULTILINE)
+_NON_ASCII = re.compile(u'[^\x00-\x7f]')
+
+
 def remove_ansi(s):
-    return re.sub(r'\x1b[^m]*m', '', s)
+    return _ANSI.sub('', s)
 
 
 def remove_trailing_whitespaces(s):
-    return "\n".join(re.sub(r' +$', '', l) for l in s.split("\n"))
+    return _TRAILING_WHITESPACES.sub('', s)
+
+
+try:
+    _is_ascii = str.isascii
+except AttributeError:  ## pragma: no cover
+    _is_ascii = lambda s: _NON_ASCII.search(s) is None  ## PY<3.7
+
+
+def _char_width(c):
+    if unicodedata.combining(c) or \
+           unicodedata.category(c) in ("Mn", "Me", "Cf"):
+        return 0
+    return 2 if unicodedata.east_asian_width(c) in ("W", "F") else 1
+
+
+def _display_width(s):
+    if "\x1b" in s:
+        s = remove_ansi(s)
+    if _is_ascii(s):
+        return len(s)
+    return sum(_char_width(c) for c in s)
+
+
+if lru_cache is not None:
+    _display_width = lru_cache(maxsize=4096)(_display_width)
+
+
+def display_width(s):
+    """Returns the number of terminal columns used to display ``s``
+
+    ANSI escape sequences are not displayed, and east asian wide
+    characters take 2 columns while combining characters take none:
+
+        >>> display_width("abc")
+        3
+        >>> display_width("\x1b[1mabc\x1b[0m")
+        3
+        >>> display_width(u"\u65e5\u672c")
+        4
+        >>> display_width(u"e\u0301")
+        1
+
+    Widths of non ASCII strings are cached.
+
+    """
+    if "\x1b" not in s and _is_ascii(s):
+        return len(s)
+    return _display_width(s)
 
 ##
 ## Format list of records
 ##
 
+def _sort_key(value):
+    """Returns key sorting ``None`` (as missing values) last"""
+    return (value is None, value)
+
+
 def records(elts, fields=None, group_by=[], order_by=[], indent="",
             field_fmts={}, head_field_fmts={}, type_fmts={},
-            totals={}):
+            totals={}, subtotals=False):
     """Display nicely a list of elts
 
     >>> elts = [{"foo": 1, "bar": 'x'},
@@ -79,69 +149,694 @@ def records(elts, fields=None, group_by=[], order_by=[], indent="",
     ------
         24
 
-    # >>> elts = [{"foo": 1,  "bar": 'x'},
-    # ...         {"foo": 23, "bar": 'abc'},
-    # ...         {"foo": 7,  "bar": 'x'}]
-    # >>> print(records(elts, fields=['foo', 'bar'],
-    # ...       group_by=['bar', 'foo'],
-    # ...       totals={'foo': sum}))
-    # foo: 1
-    #   bar: x
-    #     1 x
-    #     ---
-    #     1
-    # foo: 23
-    #   bar: abc
-    #     23 abc
-    #     ------
-    #     23
-    #   --------
-    #     23
-        
+    Records are sorted on the values of the ``order_by`` fields (groups
+    appearing in the order of their first record), missing values last:
+
+    >>> elts = [{"foo": 1,  "bar": 'x'},
+    ...         {"foo": 23, "bar": 'abc'},
+    ...         {"foo": 7,  "bar": 'x'}]
+    >>> print(records(elts, fields=['foo', 'bar'], order_by=['foo']))
+    1  x
+    7  x
+    23 abc
+    >>> print(records([{'a': 2}, {'b': 'y'}, {'a': 1}], ['a', 'b'],
+    ...               order_by=['a']))
+    1    None
+    2    None
+    None y
+
+    With ``group_by``, ``totals`` are given for each group, and
+    ``subtotals`` adds them for each upper group and for all records:
+
+    >>> print(records(elts, fields=['foo', 'bar'],
+    ...       group_by=['bar', 'foo'], order_by=['foo'],
+    ...       totals={'foo': sum}, subtotals=True))
+    bar: x
+      foo: 1
+        1 x
+        ---
+        1
+      foo: 7
+        7 x
+        ---
+        7
+      --
+      8
+    bar: abc
+      foo: 23
+        23 abc
+        ------
+        23
+      ---
+      23
+    ---
+    31
+
     """
+    if isinstance(elts, Mapping):
+        if len(group_by) == 0 and not order_by:
+            return "\n".join(iter_columns(
+                elts, fields, indent=indent, field_fmts=field_fmts,
+                type_fmts=type_fmts, totals=totals))
+        elts = columns_to_records(elts)
+
     if fields is None and len(elts) > 0:
-        fields = elts[0].keys()
+        fields = list(elts[0].keys())
+
+    if order_by:
+        elts = sorted(elts, key=lambda r: tuple(_sort_key(r.get(f))
+                                                for f in order_by))
 
     if len(group_by) > 0:
-        parted = partition(elts, lambda r: r[group_by[0]])
-        label = head_field_fmts.get("__label__", fun_id)(group_by[0])
-        value_fmt = head_field_fmts.get(group_by[0], field_fmts.get(group_by[0], fun_id))
-        head_value_fmt = lambda x: head_field_fmts.get("__value__", fun_id)(value_fmt(x))
-        return "\n".join("%s%s: %s\n%s"
-                  % (indent, label, head_value_fmt(value),
-                     records(
-                         subelts, fields, group_by=group_by[1:],
-                         order_by=order_by, indent=indent + "  ",
-                         field_fmts=field_fmts, type_fmts=type_fmts,
-                         totals=totals))
-                  for value, subelts in parted.items())
-
-    ## get max length:
+        return "\n".join(iter_groups(
+            elts, fields, group_by, indent=indent, field_fmts=field_fmts,
+            head_field_fmts=head_field_fmts, type_fmts=type_fmts,
+            totals=totals, subtotals=subtotals))
+
+    return "\n".join(iter_records(
+        elts, fields, indent=indent, field_fmts=field_fmts,
+        type_fmts=type_fmts, totals=totals))
+
+
+def _mk_fmt_column(field_fmts, type_fmts):
+    """Returns functions formatting a field value, and a field column
+
+    Columns are formatted at once with the field formatter, or with
+    the type formatter if all values share the same type:
+
+        >>> fmt_field, fmt_column = _mk_fmt_column(
+        ...     {'size': size}, {int: lambda v: "%03d" % v})
+        >>> fmt_column('size', [1, False, 2048])
+        [('1', 'B'), '', ('2.0', 'KiB')]
+        >>> fmt_column('nb', [1, 2])
+        ['001', '002']
+        >>> fmt_column('nb', [1, 'a', False])
+        ['001', 'a', '']
+
+    """
+
     fmt_field = lambda f, v: "" if v is False else \
                 field_fmts.get(f, type_fmts.get(type(v), fun_id))(v)
-    # import pdb ; pdb.set_trace()
-    # max_lengths = dict((f, max(len(unicode(fmt_field(f, r[f]))) for r in elts)) for f in fields)
-    max_lengths = dict((f, max(len(remove_ansi(fmt_field(f, r.get(f))))
-                               for r in elts))
-                       for f in fields)
-
-    def fmt_sized_field(f, v):
-        formatted = fmt_field(f, v)
-        invisible_chars = len(formatted) - len(remove_ansi(formatted))
-        return (u"%%-%ds" % (max_lengths[f] + invisible_chars)) % fmt_field(f, v)
-    fmt_record_line = lambda r: " ".join(fmt_sized_field(f, r.get(f)) for f in fields)
-
-    total = []
+
+    def fmt_column(f, values):
+        """Formats all values of field ``f`` at once when possible"""
+        fmt = field_fmts.get(f)
+        format_many = getattr(fmt, "format_many", None)
+        if format_many is not None and _numpy_of(values) is not None:
+            return list(format_many(values))
+        if _numpy_of(values) is not None:
+            values = values.tolist()
+        if fmt is None:
+            types = set(map(type, values))
+            if len(types) != 1 or bool in types:
+                return [fmt_field(f, v) for v in values]
+            fmt = type_fmts.get(types.pop(), fun_id)
+            return list(map(fmt, values))
+        kept = [v for v in values if v is not False]
+        formatted = format_many(kept) if format_many is not None else \
+                    map(fmt, kept)
+        if len(kept) == len(values):
+            return list(formatted)
+        formatted = iter(formatted)
+        return ["" if v is False else next(formatted) for v in values]
+
+    return fmt_field, fmt_column
+
+
+def _visible_lengths(column):
+    """Returns compact array of the display widths of strings in column
+
+        >>> list(_visible_lengths(["a", u"\u65e5", "\x1b[1mb\x1b[0m"]))
+        [1, 2, 1]
+
+    """
+    joined = "".join(column)
+    if "\x1b" not in joined and _is_ascii(joined):
+        return array.array('l', map(len, column))
+    return array.array('l', map(display_width, column))
+
+
+def _fmt_lines(columns, lengths, widths, indent):
+    """Yields lines of left aligned cells given by columns"""
+    padded = [[c + " " * (width - length)
+               for c, length in zip(column, column_lengths)]
+              for column, column_lengths, width
+              in zip(columns, lengths, widths)]
+    for cells in zip(*padded):
+        yield remove_trailing_whitespaces(indent + " ".join(cells))
+
+
+def _as_list(col):
+    return col.tolist() if _numpy_of(col) is not None else list(col)
+
+
+def columns_to_records(cols):
+    """Returns list of records from a dict of columns
+
+        >>> columns_to_records({'a': [1, 2], 'b': ['x', 'y']}) == [
+        ...     {'a': 1, 'b': 'x'}, {'a': 2, 'b': 'y'}]
+        True
+
+    """
+    fields = list(cols.keys())
+    values = [_as_list(col) for col in cols.values()]
+    return [dict(zip(fields, row)) for row in zip(*values)]
+
+
+def iter_columns(cols, fields=None, indent="", field_fmts={}, type_fmts={},
+                 totals={}):
+    """Yields lines displaying nicely a table given by columns
+
+    ``cols`` is a dict of field to sequence of values (lists or numpy
+    arrays), all of the same length. Formatters are resolved once per
+    column, and used on the whole column:
+
+    >>> cols = {"foo": [1, 23], "bar": ['x', 'abc']}
+    >>> for line in iter_columns(cols, fields=['foo', 'bar'],
+    ...                          totals={'foo': sum}):
+    ...     print(line)
+    1  x
+    23 abc
+    ------
+    24
+
+    ``records`` also accepts columns:
+
+    >>> print(records(cols, fields=['bar', 'foo']))
+    x   1
+    abc 23
+
+    Columns are converted to records to be sorted, and aggregates can be
+    given by name as for records:
+
+    >>> print(records(cols, fields=['bar', 'foo'], order_by=['bar'],
+    ...               totals={'foo': 'max'}))
+    abc 23
+    x   1
+    ------
+        23
+
+    """
+    if fields is None:
+        fields = list(cols.keys())
+    nb = max(len(col) for col in cols.values()) if cols else 0
+    if nb == 0:
+        return
+    fmt_field, fmt_column = _mk_fmt_column(field_fmts, type_fmts)
+
+    columns = [fmt_column(f, cols[f] if f in cols else [None] * nb)
+               for f in fields]
+    lengths = [_visible_lengths(column) for column in columns]
+    widths = [max(column_lengths) for column_lengths in lengths]
+    for line in _fmt_lines(columns, lengths, widths, indent):
+        yield line
+
     if any(f in totals for f in fields):
-        bar = "-" * (sum(max_lengths[f] for f in fields) + len(fields) - 1)
-        record_total = dict((f, "" if f not in totals else
-                             totals[f]([r[f] for r in elts]))
-                            for f in fields)
-        total = [bar, fmt_record_line(record_total)]
-    return remove_trailing_whitespaces(
-        ("%s" % indent) + \
-        ("\n%s" % indent).join([fmt_record_line(r)
-                                for r in elts] + total))
+        yield remove_trailing_whitespaces(
+            indent + "-" * (sum(widths) + len(fields) - 1))
+        aggregates = _Aggregates(dict((f, totals[f]) for f in fields
+                                      if f in totals))
+        aggregates.update_columns(
+            dict((f, cols[f] if f in cols else [None] * nb)
+                 for f in fields if f in totals))
+        total = aggregates.record(fields)
+        total = [fmt_field(f, total[f]) for f in fields]
+        for line in _fmt_lines([[c] for c in total],
+                               [_visible_lengths([c]) for c in total],
+                               widths, indent):
+            yield line
+
+
+def _chunks(elts, size):
+    chunk = []
+    for elt in elts:
+        chunk.append(elt)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+_RUNNING_AGGREGATES = {
+    sum: (lambda: 0, lambda acc, value: acc + value),
+    len: (lambda: 0, lambda acc, value: acc + 1),
+    min: (lambda: None, lambda acc, value: value if acc is None
+          else min(acc, value)),
+    max: (lambda: None, lambda acc, value: value if acc is None
+          else max(acc, value)),
+}
+for _fun, _name in ((sum, "sum"), (len, "count"), (min, "min"), (max, "max")):
+    _RUNNING_AGGREGATES[_name] = _RUNNING_AGGREGATES[_fun]
+
+
+class _Aggregates(object):
+    """Aggregates values of some fields of records
+
+    ``totals`` gives the aggregate function of each field. ``sum``,
+    ``len``, ``min`` and ``max`` (or their names, ``len`` being named
+    ``"count"``) are computed as records are added, other functions are
+    called on the list of all values:
+
+        >>> aggregates = _Aggregates({'a': sum, 'b': "max", 'c': sorted})
+        >>> aggregates.update([{'a': 1, 'b': 2, 'c': 3},
+        ...                    {'a': 2, 'b': 1, 'c': 0}])
+        >>> aggregates.record(['a', 'b', 'c', 'd']) == {
+        ...     'a': 3, 'b': 2, 'c': [0, 3], 'd': ''}
+        True
+
+    """
+
+    def __init__(self, totals):
+        self.totals = totals
+        self.running = {}
+        self.values = {}
+        for f, fun in totals.items():
+            if fun in _RUNNING_AGGREGATES:
+                init, step = _RUNNING_AGGREGATES[fun]
+                self.running[f] = [init(), step]
+            else:
+                self.values[f] = []
+
+    def __contains__(self, field):
+        return field in self.totals
+
+    def update(self, records):
+        for f, acc in self.running.items():
+            value, step = acc
+            for r in records:
+                value = step(value, r[f])
+            acc[0] = value
+        for f, values in self.values.items():
+            values.extend(r[f] for r in records)
+
+    def update_columns(self, cols):
+        """Same as ``update`` with a dict of field to column"""
+        for f, acc in self.running.items():
+            value, step = acc
+            for v in _as_list(cols[f]):
+                value = step(value, v)
+            acc[0] = value
+        for f, values in self.values.items():
+            values.extend(_as_list(cols[f]))
+
+    def add(self, record):
+        for f, acc in self.running.items():
+            acc[0] = acc[1](acc[0], record[f])
+        for f, values in self.values.items():
+            values.append(record[f])
+
+    def record(self, fields):
+        """Returns record of aggregated values of ``fields``"""
+        return dict((f, self.running[f][0] if f in self.running else
+                     self.totals[f](self.values[f]) if f in self.values
+                     else "")
+                    for f in fields)
+
+
+def iter_records(elts, fields=None, indent="", field_fmts={}, type_fmts={},
+                 totals={}, sample=None, two_pass=False, chunk_size=1024):
+    """Yields lines displaying nicely an iterable of elts
+
+    Records are processed by chunks of ``chunk_size``, each cell being
+    formatted exactly once (column by column, so using ``format_many``
+    of field formatters if available). Only the formatted cells and their
+    visible widths are kept:
+
+    >>> elts = [{"foo": 1, "bar": 'x'},
+    ...         {"foo": 23, "bar": 'abc'},
+    ...         {"foo": 456, "bar": 'y'}]
+    >>> for line in iter_records(elts, fields=['foo', 'bar']):
+    ...     print(line)
+    1   x
+    23  abc
+    456 y
+
+    By default, all cells are formatted before the first line is
+    yielded to get the exact width of the columns. To bound memory, widths
+    can be taken from a ``sample`` of the first records, the lines being
+    then streamed (larger cells could then break alignment):
+
+    >>> for line in iter_records(iter(elts), fields=['foo', 'bar'],
+    ...                          sample=2, chunk_size=1):
+    ...     print(line)
+    1  x
+    23 abc
+    456 y
+
+    Or, if ``elts`` can be iterated twice, ``two_pass`` will compute the
+    exact widths in a first pass that discards the cells, and format them
+    again to stream the lines in a second pass:
+
+    >>> for line in iter_records(elts, fields=['foo', 'bar'],
+    ...                          two_pass=True, chunk_size=1):
+    ...     print(line)
+    1   x
+    23  abc
+    456 y
+
+    ``totals`` of ``sum``, ``len``, ``min`` or ``max`` are aggregated as
+    records are going through, values of other fields having ``totals``
+    are kept to compute them:
+
+    >>> for line in iter_records(elts, fields=['bar', 'foo'],
+    ...                          totals={'foo': sum}, sample=2):
+    ...     print(line)
+    x   1
+    abc 23
+    y   456
+    ------
+        480
+
+    """
+    return _iter_table(elts, fields, indent,
+                       _mk_fmt_column(field_fmts, type_fmts), totals,
+                       sample=sample, two_pass=two_pass,
+                       chunk_size=chunk_size)
+
+
+def _iter_table(elts, fields, indent, fmts, totals, aggregates=None,
+                sample=None, two_pass=False, chunk_size=1024):
+    """Yields lines of records, see ``iter_records``
+
+    ``aggregates`` of the records can be given when already computed.
+
+    """
+    fmt_field, fmt_column = fmts
+
+    if sample is not None:
+        chunk_size = min(chunk_size, sample)
+    chunks = _chunks(elts, chunk_size)
+    first = next(chunks, None)
+    if first is None:
+        return
+    chunks = itertools.chain([first], chunks)
+    if fields is None:
+        fields = list(first[0].keys())
+    widths = [0] * len(fields)
+    if aggregates is None:
+        aggregates = _Aggregates(
+            dict((f, totals[f]) for f in fields if f in totals))
+        collect = aggregates.update
+    else:
+        collect = lambda chunk: None
+
+    def fmt_chunk(chunk, measure=True):
+        """Returns formatted columns and their visible widths"""
+        columns = [fmt_column(f, [r.get(f) for r in chunk]) for f in fields]
+        lengths = [_visible_lengths(column) for column in columns]
+        if measure:
+            for i, column_lengths in enumerate(lengths):
+                widths[i] = max(widths[i], max(column_lengths))
+        return columns, lengths
+
+    fmt_lines = lambda columns, lengths: _fmt_lines(
+        columns, lengths, widths, indent)
+
+    buffered = []
+    if two_pass:
+        for chunk in chunks:  ## first pass only measures widths
+            fmt_chunk(chunk)
+        chunks = _chunks(elts, chunk_size)
+    else:
+        nb = 0
+        for chunk in chunks:
+            buffered.append(fmt_chunk(chunk))
+            collect(chunk)
+            nb += len(chunk)
+            if sample is not None and nb >= sample:
+                break
+
+    for columns, lengths in buffered:
+        for line in fmt_lines(columns, lengths):
+            yield line
+    del buffered[:]
+
+    for chunk in chunks:
+        collect(chunk)
+        for line in fmt_lines(*fmt_chunk(chunk, measure=False)):
+            yield line
+
+    if any(f in aggregates for f in fields):
+        yield remove_trailing_whitespaces(
+            indent + "-" * (sum(widths) + len(fields) - 1))
+        record_total = aggregates.record(fields)
+        for line in fmt_lines(*fmt_chunk([record_total], measure=False)):
+            yield line
+
+
+def iter_groups(elts, fields, group_by, indent="", field_fmts={},
+                head_field_fmts={}, type_fmts={}, totals={},
+                subtotals=False):
+    """Yields lines displaying nicely elts grouped by values of fields
+
+    Records are dispatched in their groups in one pass, each group
+    keeping the running aggregates of its ``totals``, groups appearing
+    in the order of their first record:
+
+    >>> elts = [{"foo": 1, "bar": 'x'},
+    ...         {"foo": 23, "bar": 'abc'},
+    ...         {"foo": 456, "bar": 'x'}]
+    >>> for line in iter_groups(elts, ['foo'], ['bar'],
+    ...                         totals={'foo': sum}, subtotals=True):
+    ...     print(line)
+    bar: x
+      1
+      456
+      ---
+      457
+    bar: abc
+      23
+      --
+      23
+    ---
+    480
+
+    ``head_field_fmts`` formats the heads of groups, by field, and with
+    ``__label__`` and ``__value__`` on all labels and values:
+
+    >>> for line in iter_groups(elts, ['foo'], ['bar'], head_field_fmts={
+    ...         "__label__": str.upper, "bar": repr}):
+    ...     print(line)
+    BAR: 'x'
+      1
+      456
+    BAR: 'abc'
+      23
+
+    """
+    elts = iter(elts)
+    first = next(elts, None)
+    if first is None:
+        return
+    elts = itertools.chain([first], elts)
+    if fields is None:
+        fields = list(first.keys())
+    totals = dict((f, totals[f]) for f in fields if f in totals)
+
+    fmt_label = head_field_fmts.get("__label__", fun_id)
+    fmt_value = head_field_fmts.get("__value__", fun_id)
+    heads = [(fmt_label(field),
+              head_field_fmts.get(field, field_fmts.get(field, fun_id)))
+             for field in group_by]
+
+    ## One pass dispatching records and aggregating totals in each group
+    root = _Group(totals)
+    for elt in elts:
+        group = root
+        group.aggregates.add(elt)
+        for field in group_by:
+            group = group.sub(elt[field], totals)
+            group.aggregates.add(elt)
+        group.elts.append(elt)
+
+    fmts = _mk_fmt_column(field_fmts, type_fmts)
+
+    def total_lines(group, indent):
+        total = group.aggregates.record(fields)
+        columns = [fmts[1](f, [total[f]]) for f in fields]
+        lengths = [_visible_lengths(column) for column in columns]
+        widths = [column_lengths[0] for column_lengths in lengths]
+        yield remove_trailing_whitespaces(
+            indent + "-" * (sum(widths) + len(fields) - 1))
+        for line in _fmt_lines(columns, lengths, widths, indent):
+            yield line
+
+    def group_lines(group, level, indent):
+        label, value_fmt = heads[level]
+        for value, sub in group.groups.items():
+            yield "%s%s: %s" % (indent, label, fmt_value(value_fmt(value)))
+            if level + 1 < len(heads):
+                for line in group_lines(sub, level + 1, indent + "  "):
+                    yield line
+                if subtotals and totals:
+                    for line in total_lines(sub, indent + "  "):
+                        yield line
+            else:
+                for line in _iter_table(sub.elts, fields, indent + "  ",
+                                        fmts, totals, sub.aggregates):
+                    yield line
+
+    for line in group_lines(root, 0, indent):
+        yield line
+    if subtotals and totals:
+        for line in total_lines(root, indent):
+            yield line
+
+
+class _Group(object):
+    """Records of a group and its sub groups by values"""
+
+    __slots__ = ("groups", "elts", "aggregates")
+
+    def __init__(self, totals):
+        self.groups = {}
+        self.elts = []
+        self.aggregates = _Aggregates(totals)
+
+    def sub(self, value, totals):
+        group = self.groups.get(value)
+        if group is None:
+            group = self.groups[value] = _Group(totals)
+        return group
+
+
+def write_records(elts, stream, **kwargs):
+    """Writes lines of ``iter_records(elts, **kwargs)`` in ``stream``
+
+    >>> import sys
+    >>> write_records([{"foo": 1, "bar": 'x'}], sys.stdout,
+    ...               fields=['bar', 'foo'])
+    x 1
+
+    """
+    for line in iter_records(elts, **kwargs):
+        stream.write(line + "\n")
+
+
+class LiveRecords(object):
+    """Displays successive states of a table of records
+
+    Formatted cells, their widths and lines are kept between calls of
+    ``update``, so that only new or changed records are formatted again,
+    and only lines that changed are returned (as ``(index, line)``):
+
+    >>> live = LiveRecords(['name', 'done'], key=lambda r: r['name'])
+    >>> live.update([{'name': 'a', 'done': 1}, {'name': 'b', 'done': 5}])
+    [(0, 'a 1'), (1, 'b 5')]
+    >>> live.update([{'name': 'a', 'done': 2}, {'name': 'b', 'done': 5}])
+    [(0, 'a 2')]
+
+    A column getting wider (or narrower) changes all lines:
+
+    >>> live.update([{'name': 'a', 'done': 2}, {'name': 'bc', 'done': 5}])
+    [(0, 'a  2'), (1, 'bc 5')]
+    >>> print(live)
+    a  2
+    bc 5
+
+    Lines of removed records are not part of ``lines`` anymore (without
+    ``key``, records are identified by their position):
+
+    >>> live.update([{'name': 'a', 'done': 3}])
+    [(0, 'a 3')]
+    >>> live.lines
+    ['a 3']
+
+    A failing update leaves the table unchanged:
+
+    >>> live = LiveRecords(['n', 'v'], key=lambda r: r['n'])
+    >>> live.update([{'n': 'long', 'v': 1}])
+    [(0, 'long 1')]
+    >>> live.update([{'n': 'long', 'v': 1}, {'n': 'long', 'v': 2}])
+    Traceback (most recent call last):
+    ...
+    ValueError: Duplicate key 'long' in records.
+    >>> live.update([{'n': 'b', 'v': 2}])
+    [(0, 'b 2')]
+
+    """
+
+    def __init__(self, fields, key=None, indent="", field_fmts={},
+                 type_fmts={}):
+        self.fields = list(fields)
+        self.key = key
+        self.indent = indent
+        self._fmt_column = _mk_fmt_column(field_fmts, type_fmts)[1]
+        self._rows = {}  ## key -> [values, cells, lengths, line]
+        self._counts = [{} for _ in self.fields]  ## width -> nb of cells
+        self.widths = [0] * len(self.fields)
+        self.lines = []
+
+    def __str__(self):
+        return "\n".join(self.lines)
+
+    def _count(self, lengths, inc):
+        for counts, length in zip(self._counts, lengths):
+            nb = counts.get(length, 0) + inc
+            if nb:
+                counts[length] = nb
+            else:
+                del counts[length]
+
+    def _render(self, rows):
+        """Sets the line of given rows"""
+        if not rows:
+            return
+        columns = list(zip(*[row[1] for row in rows]))
+        lengths = list(zip(*[row[2] for row in rows]))
+        lines = _fmt_lines(columns, lengths, self.widths, self.indent)
+        for row, line in zip(rows, lines):
+            row[3] = line
+
+    def update(self, elts):
+        """Updates the table and returns list of (index, line) changed"""
+        fields = self.fields
+        elts = list(elts)
+        keys = range(len(elts)) if self.key is None else \
+               [self.key(elt) for elt in elts]
+        ## nothing is changed before all records are formatted
+        previous, rows, changed, stale = self._rows, {}, [], []
+        for k, elt in zip(keys, elts):
+            if k in rows:
+                raise ValueError("Duplicate key %r in records." % (k, ))
+            values = tuple(map(elt.get, fields))
+            row = previous.get(k)
+            if row is None or row[0] != values:
+                if row is not None:
+                    stale.append(row)
+                row = [values, None, None, None]
+                changed.append(row)
+            rows[k] = row
+        stale.extend(row for k, row in previous.items() if k not in rows)
+
+        if changed:
+            columns = [self._fmt_column(f, [row[0][i] for row in changed])
+                       for i, f in enumerate(fields)]
+            lengths = [_visible_lengths(column) for column in columns]
+            for i, row in enumerate(changed):
+                row[1] = tuple(column[i] for column in columns)
+                row[2] = tuple(column_lengths[i]
+                               for column_lengths in lengths)
+
+        for row in stale:
+            self._count(row[2], -1)
+        for row in changed:
+            self._count(row[2], 1)
+        self._rows = rows
+
+        widths = [max(counts) if counts else 0 for counts in self._counts]
+        if widths != self.widths:
+            self.widths = widths
+            changed = list(rows.values())
+        self._render(changed)
+
+        old, lines = self.lines, [rows[k][3] for k in keys]
+        self.lines = lines
+        changes = [(i, line) for i, (line, prev) in enumerate(zip(lines, old))
+                   if line is not prev and line != prev]
+        changes.extend(enumerate(lines[len(old):], len(old)))
+        return changes
 
 
 ##
@@ -6,9 +6,26 @@ This module define the class Formatter and it main concepts.
 
 """
 
+import sys
 import math
+import bisect
+import inspect
 import datetime
-import sact.epoch
+import functools
+
+try:
+    from collections.abc import Mapping
+except ImportError:  ## pragma: no cover
+    from collections import Mapping  ## PY2
+
+try:
+    from collections import ChainMap
+    from types import MappingProxyType
+except ImportError:  ## pragma: no cover
+    ## PY2: contexts will be fully copied on each call
+    ChainMap = MappingProxyType = None
+
+from . import stats
 
 
 ## Python 3 compatibility layer
@@ -28,7 +45,147 @@ else:  ## pragma: no cover
     basestring = basestring
 
 
-class Formatter(object):
+def _format_uses_context(fun):
+    """Tells if given ``format`` function follows the new API
+
+    New API ``format`` functions receive the value and the context,
+    old API ones only receive the value:
+
+        >>> _format_uses_context(lambda self, value, context=None: None)
+        True
+        >>> _format_uses_context(lambda self, value: None)
+        False
+
+    """
+    try:
+        getargspec = inspect.getfullargspec
+    except AttributeError:  ## pragma: no cover
+        getargspec = inspect.getargspec  ## PY2
+    posargs = getargspec(fun)[0]
+    if posargs and posargs[0] == 'self':
+        posargs = posargs[1:]
+    return len(posargs) != 1
+
+
+def _numpy_of(values):
+    """Returns numpy module if ``values`` is a numpy array, None otherwise
+
+    numpy is never imported here: if ``values`` is a numpy array,
+    it has already been loaded.
+
+        >>> _numpy_of([1, 2]) is None
+        True
+
+    """
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return numpy
+    return None
+
+
+## Context keys holding i18n informations
+_I18N_KEYS = frozenset(('_', 'gettextargs', 'trans'))
+
+
+def _no_trans(msg, *args, **kwargs):
+    return unicode(msg)
+
+
+def _mk_trans(context):
+
+    def trans(msg, *args, **kwargs):
+        """Shortcut function for translation"""
+        kwargs.update(context['gettextargs'])
+        return context['_'](msg, *args, **kwargs)
+
+    trans.context = context
+    return trans
+
+
+def _mk_base_context(context):
+    """Returns a read-only context holding i18n informations
+
+    Given dict is completed in place, and viewed without copy:
+
+        >>> ctx = {}
+        >>> base = _mk_base_context(ctx)
+        >>> sorted(ctx.keys())
+        ['_', 'gettextargs', 'trans']
+        >>> ctx['foo'] = 'bar'
+        >>> base['foo']
+        'bar'
+        >>> base['foo'] = 'wiz'
+        Traceback (most recent call last):
+        ...
+        TypeError: ...
+
+    ``trans`` is bound again if it was made for another context, as in a
+    copy of a formatter context:
+
+        >>> copy = dict(ctx, gettextargs={'a': 1})
+        >>> _ = _mk_base_context(copy)
+        >>> copy['trans'] is ctx['trans']
+        False
+
+    Other mappings are copied, and non dict-like contexts ignored:
+
+        >>> sorted(_mk_base_context(3).keys())
+        ['_', 'gettextargs', 'trans']
+
+    """
+    if not isinstance(context, dict):
+        try:
+            context = {} if context is None else dict(context)
+        except (ValueError, TypeError):
+            context = {}
+    context.setdefault('_', _no_trans)
+    context.setdefault('gettextargs', {})
+    if getattr(context.get('trans'), 'context', None) is not context:
+        context['trans'] = _mk_trans(context)
+    return MappingProxyType(context)
+
+
+def _private(context):
+    """Returns ``context`` under a new layer receiving its writes"""
+    if ChainMap is not None and isinstance(context, ChainMap):
+        return context.new_child()
+    return dict(context) if isinstance(context, dict) else context
+
+
+class FormatterType(type):
+    """Resolves once per class the API followed by ``format``
+
+    This avoids any introspection on the hot path of
+    ``Formatter.__call__``.
+
+    """
+
+    def __init__(cls, name, bases, dct):
+        super(FormatterType, cls).__init__(name, bases, dct)
+        if 'format' in dct:
+            cls._format_uses_context = _format_uses_context(dct['format'])
+        if 'format_many' in dct:
+            cls.format_many = _instrumented_format_many(dct['format_many'])
+
+
+def _instrumented_format_many(format_many):
+    """Returns ``format_many`` accounted in ``stats`` when enabled"""
+
+    @functools.wraps(format_many)
+    def wrapper(self, values, context=None, **kwargs):
+        if stats.enabled:
+            with stats.timer("format_many.%s" % type(self).__name__):
+                return format_many(self, values, context, **kwargs)
+        return format_many(self, values, context, **kwargs)
+    return wrapper
+
+
+## Python 2 and 3 compatible way to set the metaclass
+_FormatterBase = FormatterType('_FormatterBase', (object, ),
+                               {'_format_uses_context': True})
+
+
+class Formatter(_FormatterBase):
     r"""Generic formatter factory.
 
     A Formatter take a context and returns a callable which will use
@@ -51,7 +208,8 @@ class Formatter(object):
       ...     def format(self, value, context):
       ...          if isinstance(context, basestring): return "%r" % context
       ...          if context is None: return 'None'
-      ...          return "value: %s\ncontext:\n%s" % (value, pformat(context))
+      ...          return "value: %s\ncontext:\n%s" % (value,
+      ...                                          pformat(dict(context)))
       ...
 
     You can setup context at instanciation time or at call time:
@@ -109,6 +267,34 @@ class Formatter(object):
       'trans': <function ...trans at ...>}
 
 
+    The context given to ``format`` is a mapping layering call-time
+    values over the formatter context (a ``ChainMap`` on python 3, a
+    ``dict`` copy on python 2). It can be written, but writes are only
+    seen in the current call, and never change given contexts:
+
+      >>> class W(Formatter):
+      ...     def format(self, value, context):
+      ...         context['seen'] = True
+      ...         return str(value)
+      >>> ctx = {'data': 'foo'}
+      >>> w = W(ctx)
+      >>> w(1), w(2, ctx), w(3, data='bar')
+      ('1', '2', '3')
+      >>> ctx
+      {'data': 'foo'}
+
+    Once set, ``context`` can also be changed in place:
+
+      >>> class AddNb(Formatter):
+      ...     def format(self, value, context):
+      ...         return value + context['nb']
+      >>> add = AddNb(nb=1)
+      >>> add.context = {'nb': 2}
+      >>> add.context['nb'] = 5
+      >>> add(0), add(0, {}), add.format_many([0])
+      (5, 5, [5])
+
+
     Support of old API:
     -------------------
 
@@ -122,22 +308,57 @@ class Formatter(object):
       >>> print(fmt('hop'))
       hop
 
+    Batch formatting
+    ----------------
+
+    A whole sequence of values can be formatted in one call, the context
+    being resolved only once:
+
+      >>> Formatter().format_many([1, 2, 3])
+      ['1', '2', '3']
+      >>> fmt.format_many(['hop', 'hip'])
+      ['hop', 'hip']
+
     """
 
     def __init__(self, context=None, **kwargs):
         self.context = self._get_context(context, **kwargs)
 
+    _base_context = None
+
+    @property
+    def context(self):
+        return self._context
+
+    @context.setter
+    def context(self, value):
+        self._context = value
+        if ChainMap is not None:
+            self._base_context = _mk_base_context(value)
+
     def _get_context(self, context=None, **kwargs):
         """This function returns a context from keyword args and context
 
         Note: to be thread safe, this function does not store anything in
-        the current object.
+        the current object. Given values are layered upon a read-only
+        view of ``self.context`` without copying it, under a new empty
+        layer receiving all writes.
 
         Note2: to be compatible with default overriding classes we must
         check the prototype of the function format.
 
         """
 
+        base = self._base_context
+        if base is not None and (context is None or
+                                 isinstance(context, Mapping)):
+            if not context and not kwargs:
+                return ChainMap({}, base)
+            return self._layer_context(base, context or {}, kwargs)
+
+        if context is None:
+            context = {}
+
         ## Get a dict copy of self.context if existent
 
         try:
@@ -150,32 +371,15 @@ class Formatter(object):
 
         ## Merge with context values if any
 
-        if context is None:
-            context = {}
-
-        if isinstance(context, dict):
-            try:
-                _context.update(context)  ## Update with new values
-                context = _context
-
-                ## Put i18n informations to context
-
-                if '_' not in context:
-                    def trans(msg, *args, **kwargs):
-                        return unicode(msg)
-                    context['_'] = trans
-
-                context.setdefault('gettextargs', {})
-
-                def trans(msg, *args, **kwargs):
-                    """Shortcut function for translation"""
-                    kwargs.update(context['gettextargs'])
-                    return context['_'](msg, *args, **kwargs)
+        if isinstance(context, Mapping):
+            _context.update(context)  ## Update with new values
+            context = _context
 
-                context['trans'] = trans
+            ## Put i18n informations to context
 
-            except TypeError:  ## Context is not a dict
-                pass  ## context must be unchanged
+            context.setdefault('_', _no_trans)
+            context.setdefault('gettextargs', {})
+            context['trans'] = _mk_trans(context)
 
         ## Merge with keyword arguments
 
@@ -190,30 +394,54 @@ class Formatter(object):
 
         return context
 
-    def __call__(self, value, context=None, **kwargs):
-
-        ## XXXvlab: ---- COMPATIBILITY CODE BEGIN (to delete)
-
-        self._formatting_structure = self.context
+    @staticmethod
+    def _layer_context(base, context, kwargs):
+        """Returns a view of ``context`` and ``kwargs`` over ``base``
 
-        import inspect
-        from warnings import warn
+        Nothing is copied, layers of given ``ChainMap`` contexts are
+        reused as is. Writes go to a new top layer, so that given
+        ``context`` is never changed.
 
-        (posargs, _, _, defaults) = inspect.getargspec(self.format)
-
-        if posargs[0] == 'self':
-            posargs = posargs[1:]
-
-        if len(posargs) == 1: ## OLD API
-        ##XXXgsa: finaly we keep the old API
+        """
+        rebind = not _I18N_KEYS.isdisjoint(kwargs) or \
+                 '_' in context or 'gettextargs' in context or \
+                 'trans' in context
+        maps = list(context.maps) if isinstance(context, ChainMap) else \
+               [context]
+        maps.append(base)
+        layer = dict(kwargs)
+        maps.insert(0, layer)
+        view = ChainMap(*maps)
+        if rebind and 'trans' not in kwargs:
+            layer['trans'] = _mk_trans(view)
+        return view
+
+    ## XXXvlab: ---- COMPATIBILITY CODE (to delete)
+    _formatting_structure = property(lambda self: self.context)
 
-        #     warn('Formatter.format(..) should use 3 arguments with new API.',
-        #          DeprecationWarning, stacklevel=2)
+    def __call__(self, value, context=None, **kwargs):
+        if stats.enabled:
+            with stats.timer("format.%s" % type(self).__name__):
+                return self.format(value) if not self._format_uses_context \
+                       else self.format(value,
+                                        self._get_context(context, **kwargs))
+        if not self._format_uses_context:  ## OLD API
+            ##XXXgsa: finaly we keep the old API
             return self.format(value)
+        return self.format(value, self._get_context(context, **kwargs))
 
-        ## --- COMPATIBILITY CODE END
+    def format_many(self, values, context=None, **kwargs):
+        """Returns the list of formatted ``values``
 
-        return self.format(value, self._get_context(context, **kwargs))
+        The context is resolved once, and shared by all ``values``.
+        Subclasses can override it to provide vectorized versions.
+
+        """
+        format = self.format
+        if not self._format_uses_context:  ## OLD API
+            return [format(value) for value in values]
+        context = self._get_context(context, **kwargs)
+        return [format(value, context) for value in values]
 
     def format(self, value, context=None):
         # Default formatting does nothing
@@ -270,12 +498,141 @@ class CompoundFormatter(Formatter):
     >>> CompoundFormatter(compound=[AddX(nb=20), Embrace(sep='<>')])(10)
     '<30>'
 
+    Compilation
+    ===========
+
+    Nested compound formatters (as created by ``|``) are flattened and
+    the context of each stage is merged only once, in a single callable
+    calling directly the ``format`` method of each stage:
+
+    >>> myfmt = AddX(nb=1) | AddX(nb=2) | Embrace(sep='[]')
+    >>> fused = myfmt.compile()
+    >>> fused(10)
+    '[13]'
+
+    This is what is used when calling a compound formatter without
+    any context:
+
+    >>> myfmt(10)
+    '[13]'
+
+    Compilation is done again as soon as a stage, or a context, is
+    replaced:
+
+    >>> add = AddX(nb=1)
+    >>> added = add | AddX(nb=10)
+    >>> added(0)
+    11
+    >>> add.context = dict(add.context, nb=100)
+    >>> added(0)
+    110
+    >>> added.context['compound'].append(AddX(nb=1000))
+    >>> added(0)
+    1110
+
+    A whole column can be streamed through all the stages:
+
+    >>> myfmt.format_many([10, 20])
+    ['[13]', '[23]']
+
     """
 
+    _fused = None  ## (signature, compiled stages)
+
+    def _stages(self, context):
+        """Returns flattened list of (format, context) of all stages
+
+        Old API formatters get a None context.
+
+        """
+        stages = []
+        for subformatter in self.context['compound']:
+            if not isinstance(subformatter, Formatter):
+                stages.append((subformatter, context))
+            elif isinstance(subformatter, CompoundFormatter):
+                stages.extend(subformatter._stages(
+                    subformatter._get_context(context)))
+            elif subformatter._format_uses_context:
+                stages.append((subformatter.format,
+                               subformatter._get_context(context)))
+            else:
+                stages.append((subformatter.format, None))
+        return stages
+
+    def _compile(self, context):
+        stages = self._stages(context)
+
+        def fused(value):
+            for format, context in stages:
+                value = format(value) if context is None else \
+                        format(value, _private(context))
+            return value
+
+        return fused
+
+    def compile(self, context=None, **kwargs):
+        """Returns one callable formatting a value through all stages"""
+        return self._compile(self._get_context(context, **kwargs))
+
+    def _signature(self):
+        """Returns list of the objects compiled stages depend on
+
+        Contexts are layered without copy, so in place changes are seen
+        by compiled stages, but not the replacement of a formatter, of
+        its context, or of the list of stages.
+
+        """
+        compound = self.context['compound']
+        signature = [self._base_context, compound]
+        for subformatter in compound:
+            signature.append(subformatter)
+            if isinstance(subformatter, CompoundFormatter):
+                signature.extend(subformatter._signature())
+            elif isinstance(subformatter, Formatter):
+                signature.append(subformatter._base_context)
+        return signature
+
+    def _cached_compile(self):
+        """Returns (compiled stages, True if they were in cache)"""
+        signature = self._signature()
+        if self._fused is not None:
+            cached, fused = self._fused
+            if len(cached) == len(signature) and \
+                   all(a is b for a, b in zip(cached, signature)):
+                return fused, True
+        fused = self.compile()
+        if ChainMap is not None:  ## contexts are copies otherwise
+            self._fused = signature, fused
+        return fused, False
+
+    def __call__(self, value, context=None, **kwargs):
+        if stats.enabled:
+            with stats.timer("format.%s" % type(self).__name__):
+                return self._instrumented_compile(context, kwargs)(value)
+        if context is None and not kwargs:
+            return self._cached_compile()[0](value)
+        return self.compile(context, **kwargs)(value)
+
+    def _instrumented_compile(self, context, kwargs):
+        if context is None and not kwargs:
+            fused, hit = self._cached_compile()
+            stats.incr("format.compile.hits" if hit else
+                       "format.compile.misses")
+            return fused
+        stats.incr("format.compile.misses")
+        return self.compile(context, **kwargs)
+
     def format(self, value, context=None):
+        return self._compile(context)(value)
+
+    def format_many(self, values, context=None, **kwargs):
+        context = self._get_context(context, **kwargs)
         for subformatter in self.context['compound']:
-            value = subformatter(value, context)
-        return value
+            if isinstance(subformatter, Formatter):
+                values = subformatter.format_many(values, context)
+            else:
+                values = [subformatter(value, context) for value in values]
+        return values
 
 
 def Chain(chain):
@@ -407,89 +764,197 @@ class TimeStampFormatter(Formatter):
     ...
     ValueError: ...
 
+    Caching
+    ~~~~~~~
+
+    Whatever the value, the part of the ISO representation to display
+    only depends on the timeframe and the structure: it is computed once
+    and cached by the formatter.
+
+    Conversion of timestamps to their ISO representation can be cached
+    with a LRU cache by providing its size in ``cache_size``. This is
+    useful if the same timestamps are formatted repeatedly:
+
+    >>> format_timestamp = TimeStampFormatter(cache_size=1024)
+    >>> assert format_timestamp(1226929090) == '2008-11-17 13:38:10'
+
+    Bulk formatting
+    ~~~~~~~~~~~~~~~
+
+    ``format_many`` only converts once each day seen in the integer
+    timestamps, time of day being computed arithmetically. This is
+    especially efficient on sorted timestamps:
+
+    >>> w = (1226909090, 1226959090)
+    >>> format_timestamp = TimeStampFormatter(structure=s, timeframe=w)
+    >>> format_timestamp.format_many([1226909090, 1226919090, 1226959090])
+    ['08:04:50', '10:51:30', '21:58:10']
+
+    >>> TimeStampFormatter().format_many([-1, 0, 1226929090.5])
+    ['1969-12-31 23:59:59', '1970-01-01 00:00:00', '2008-11-17 13:38:10']
+
     """
 
+    _window = None
+    _cached_short = None
+
+    def _get_window(self, context):
+        """Returns timeframe and slice to display, caching the last one"""
+        if 'timeframe' not in context:
+            return None
+        timeframe, structure = context['timeframe'], context['structure']
+        cached = self._window
+        if cached is None or cached[0] is not timeframe or \
+               cached[1] is not structure:
+            cached = (timeframe, structure,
+                      _mk_timeframe_window(timeframe, structure))
+            self._window = cached
+        return cached[2]
+
+    def _get_short(self, context):
+        """Returns function converting timestamps to short ISO strings"""
+        cache_size = context.get('cache_size')
+        if not cache_size or lru_cache is None:
+            return _short
+        cached = self._cached_short
+        if cached is None or cached[0] != cache_size:
+            cached = (cache_size, lru_cache(maxsize=cache_size)(_short))
+            self._cached_short = cached
+        return cached[1]
+
     def format(self, value, context=None):
+        short = self._get_short(context)(value)
+        window = self._get_window(context)
+        if window is None:
+            return unicode(short)
+        return _cut_short(short, value, window)
+
+    def format_many(self, values, context=None, **kwargs):
+        context = self._get_context(context, **kwargs)
+        short = self._get_short(context)
+        window = self._get_window(context)
+        numpy = _numpy_of(values)
+        if numpy is not None:
+            values = values.tolist()
+
+        res = []
+        day, prefix = None, None
+        for value in values:
+            if isinstance(value, int):
+                ## UTC days have exactly 86400 seconds
+                seconds = value % 86400
+                if value - seconds != day:
+                    day = value - seconds
+                    prefix = short(day)[:11]
+                minutes, seconds = divmod(seconds, 60)
+                hours, minutes = divmod(minutes, 60)
+                formatted = u"%s%02d:%02d:%02d" % (
+                    prefix, hours, minutes, seconds)
+            else:
+                formatted = short(value)
+            res.append(unicode(formatted) if window is None else
+                       _cut_short(formatted, value, window))
+        return res
 
-        dt = sact.epoch.Time.fromtimestamp(value)
 
-        if 'timeframe' not in context:
-            return unicode(dt.short)
+try:
+    from functools import lru_cache
+except ImportError:  ## pragma: no cover
+    lru_cache = None  ## PY2: ``cache_size`` is ignored
 
-        first, last = context['timeframe']
-        # raises TypeError if not castable:
-        first, last = int(first), int(last)
 
-        if not first <= last:
-            raise ValueError("timeframe has lower bound greater than "
-                             "its greated bound (%d, %d)" % (first, last))
+def _short(value):
+    import sact.epoch  ## deferred as only ``TimeStampFormatter`` needs it
+    return sact.epoch.Time.fromtimestamp(value).short
 
-        if not first <= value <= last:
-            raise ValueError("value %d is not in provided time "
-                             "window (%d, %d)" % (value, first, last))
 
-        first = sact.epoch.Time.fromtimestamp(first).short
-        last = sact.epoch.Time.fromtimestamp(last).short
+def _cut_short(short, value, window):
+    """Returns displayed part of ``short`` ISO string of ``value``"""
+    first, last, start_from, end_at = window
+    if not first <= value <= last:
+        raise ValueError("value %d is not in provided time "
+                         "window (%d, %d)" % (value, first, last))
+    return unicode(short[start_from:end_at])
 
-        # find index of first char that differs is ``first`` and ``last``
-        diff = False
-        i = 0
-        for i, c in enumerate(first):
-            if c != last[i]:
-                diff = True
-                break
-        if not diff:
-            raise ValueError("Time frame cannot be equal "
-                             "to the second (%d, %d)"
-                             % context['timeframe'])
-
-        # uniformize separation char
-        last = last.replace("-", " ").replace(":", " ")
-        last_tuple = last.split(' ')
-
-        # now get the index of the previous non-digit char
-        cpt = 0
-        for cpt in range(i):
-            char = last[i - 1 - cpt]
-            if char == u' ':
-                break
 
-        # next char should be our first index
-        start_from = i - cpt
-        cutlist = last[start_from:].split(' ')
-        first_elmt = 6 - len(cutlist)
-
-        # finds the smallest format that contains first_elmt
-        candidates = [(lmin, lmax) for lmin, lmax in context['structure']
-                      if lmin <= first_elmt <= lmax]
-
-        # take the one having the best precision
-        best_lmax = 0
-        for lmin, lmax in candidates:
-            if lmax > best_lmax:
-                best_lmax = lmax
-
-        # filter out candidates that have not lmax = best_lmax
-        candidates = [(lmin, lmax) for lmin, lmax in candidates
-                      if lmax == best_lmax]
-
-        # get the smallest
-        smallest = None
-        smallest_size = 7
-        for lmin, lmax in candidates:
-            if (lmax - lmin) < smallest_size:
-                smallest_size = lmax - lmin
-                smallest = (lmin, lmax)
-        lmin, lmax = smallest
-        # get index in iso string of start and end
-        if lmin == 0:
-            start_from = 0
-        else:
-            start_from = len(' '.join(last_tuple[0:lmin])) + 1
-        end_at = len(' '.join(last_tuple[0:lmax + 1]))
+def _mk_timeframe_window(timeframe, structure):
+    """Returns bounds of timeframe and slice of the ISO string to display
+
+        >>> _mk_timeframe_window((1226909090, 1226959090),
+        ...                      ((0, 2), (1, 4), (3, 5)))
+        (1226909090, 1226959090, 11, 19)
 
-        # final cut !
-        return unicode(dt.isoformat(" ")[start_from:end_at])
+    """
+    first, last = timeframe
+    # raises TypeError if not castable:
+    first, last = int(first), int(last)
+
+    if not first <= last:
+        raise ValueError("timeframe has lower bound greater than "
+                         "its greated bound (%d, %d)" % (first, last))
+
+    bounds = first, last
+    first = _short(first)
+    last = _short(last)
+
+    # find index of first char that differs is ``first`` and ``last``
+    diff = False
+    i = 0
+    for i, c in enumerate(first):
+        if c != last[i]:
+            diff = True
+            break
+    if not diff:
+        raise ValueError("Time frame cannot be equal "
+                         "to the second (%d, %d)"
+                         % bounds)
+
+    # uniformize separation char
+    last = last.replace("-", " ").replace(":", " ")
+    last_tuple = last.split(' ')
+
+    # now get the index of the previous non-digit char
+    cpt = 0
+    for cpt in range(i):
+        char = last[i - 1 - cpt]
+        if char == u' ':
+            break
+
+    # next char should be our first index
+    start_from = i - cpt
+    cutlist = last[start_from:].split(' ')
+    first_elmt = 6 - len(cutlist)
+
+    # finds the smallest format that contains first_elmt
+    candidates = [(lmin, lmax) for lmin, lmax in structure
+                  if lmin <= first_elmt <= lmax]
+
+    # take the one having the best precision
+    best_lmax = 0
+    for lmin, lmax in candidates:
+        if lmax > best_lmax:
+            best_lmax = lmax
+
+    # filter out candidates that have not lmax = best_lmax
+    candidates = [(lmin, lmax) for lmin, lmax in candidates
+                  if lmax == best_lmax]
+
+    # get the smallest
+    smallest = None
+    smallest_size = 7
+    for lmin, lmax in candidates:
+        if (lmax - lmin) < smallest_size:
+            smallest_size = lmax - lmin
+            smallest = (lmin, lmax)
+    lmin, lmax = smallest
+    # get index in iso string of start and end
+    if lmin == 0:
+        start_from = 0
+    else:
+        start_from = len(' '.join(last_tuple[0:lmin])) + 1
+    end_at = len(' '.join(last_tuple[0:lmax + 1]))
+
+    return bounds + (start_from, end_at)
 
 
 class FancyNumberFormatter(Formatter):
@@ -707,55 +1172,170 @@ class FancyNumberFormatter(Formatter):
     ---------
 
     You must provide a 'None' value as last limit in the formatting
-    structure. If you forget it, an exception should raise::
+    structure. If you forget it, an exception should raise as soon as
+    the formatter is created::
 
     >>> format_timedelta = FancyNumberFormatter(structure=(
     ... #   limit    base  format
     ... (10**3,10**-6, (u'%(value)d microseconds', {'value': 1})),
     ... (10**3, 10**3, (u'%(value).2f ms'        , {'value': 1})),
     ... ))
-
-    >>> format_timedelta(832)
     Traceback (most recent call last):
     ...
     TypeError: formatting structure is incorrect
 
-    """
+    Values that can't be converted to a float raise their own error::
 
-    def format(self, value, context=None):
-        value = float(value)  ## generates exception if not castable to a float
-        base = value
+    >>> format_timedelta = FancyNumberFormatter(structure=(
+    ...     (None, 1, (u'%(value)d s', {'value': 1})), ))
+    >>> format_timedelta('abc')
+    Traceback (most recent call last):
+    ...
+    ValueError: could not convert string to float: 'abc'
 
-        def _format(base, format):
-            if len(format) == 3:
-                msg, scales, order = format
-            else:
-                msg, scales = format
-                order = sorted(scales.keys())
+    Compilation
+    -----------
 
-            values = {}
-            for key in order:
-                values[key] = base / scales[key]
-                base %= scales[key]
+    The structure is compiled once in a table of cumulated limits
+    where the line to use is found by bisection, along with sorted
+    scales. Translated messages are cached per translation function.
+    So formatting many values is cheap, and even more with
+    ``format_many``:
 
-            msg = context['trans'](msg)
-            return msg % (values)
+    >>> format_timedelta = FancyNumberFormatter(structure=(
+    ... #   limit    base  format
+    ...    (10**3,     1, (u'< 1 ms'                        , {} )),
+    ...    (10**3, 10**3, (u'%(value)d ms'                  , {'value': 1} )),
+    ...    (None , 10**3, (u'%(value).1f s'                 , {'value': 1} )),
+    ... ))
+    >>> format_timedelta.format_many([800, 2500, 2500 * 10**3])
+    ['< 1 ms', '2 ms', '2.5 s']
 
-        try:
-            value /= context['structure'][0][1]
+    """
+
+    _table = None
+    _msgs = None
+
+    @Formatter.context.setter
+    def context(self, value):
+        Formatter.context.fset(self, value)
+        self._table = None
+        if isinstance(value, Mapping) and 'structure' in value:
+            ## raises TypeError early on incorrect structure
+            self._get_table(value)
+
+    def _get_table(self, context):
+        """Returns compiled structure, caching the last one"""
+        structure = context['structure']
+        cached = self._table
+        if cached is None or cached[0] is not structure:
+            cached = (structure, _mk_fancy_table(structure))
+            self._table = cached
+        return cached[1]
+
+    def _get_msgs(self, table, context):
+        """Returns translated messages, caching the last ones"""
+        trans = context['trans']
+        cached = self._msgs
+        if cached is None or cached[0] is not table or \
+               cached[1] is not trans:
+            cached = (table, trans,
+                      [trans(msg) for _divisors, msg, _scales in table[2]])
+            self._msgs = cached
+        return cached[2]
+
+    def format(self, value, context=None):
+        return self._format_values((value, ), context)[0]
 
-            for limit, factor, fmt in context['structure']:
-                base = float(base) / factor
-                if not limit or 0 <= value < limit:
-                    return _format(base, fmt)
-                value = float(value) / limit
+    def format_many(self, values, context=None, **kwargs):
+        return self._format_values(values,
+                                   self._get_context(context, **kwargs))
 
-            raise TypeError  ## raise error
+    def _format_values(self, values, context):
+        ## generates exception if not castable to a float
+        values = [float(value) for value in values]
+        try:
+            table = self._get_table(context)
+            first_factor, limits, rows = table
+            msgs = self._get_msgs(table, context)
+            last = len(limits)
+            bisect_right = bisect.bisect_right
+
+            res = []
+            for value in values:
+                base = value
+                value /= first_factor
+                idx = bisect_right(limits, value) if 0 <= value else last
+                divisors, _msg, scales = rows[idx]
+                for divisor in divisors:
+                    base /= divisor
+                formatted = {}
+                for key, scale in scales:
+                    formatted[key] = base / scale
+                    base %= scale
+                res.append(msgs[idx] % formatted)
+            return res
 
         except TypeError:
             raise TypeError("formatting structure is incorrect")
 
 
+def _mk_fancy_table(structure):
+    """Compiles a ``FancyNumberFormatter`` structure
+
+    Returns ``(first_factor, limits, rows)``: line ``i`` of the structure
+    is used for values (divided by the first factor) below ``limits[i]``,
+    the product of all limits up to line ``i``. Each row holds the
+    successive divisors to apply to get the base, the message, and the
+    ordered ``(key, scale)`` couples:
+
+        >>> _mk_fancy_table((
+        ...    (   2,     1, (u'%(value)d single'                   , {'value': 1})),
+        ...    (   2,     1, (u'%(value_1)d duo %(value_2)d single' , {'value_1': 2, 'value_2': 1})),
+        ...    (None,     2, (u'%(value_1)d quartet %(value_2)d duo', {'value_1': 2, 'value_2': 1})),
+        ... ))  # doctest: +NORMALIZE_WHITESPACE
+        (1, [2.0, 4.0],
+         [((), '%(value)d single', [('value', 1)]),
+          ((), '%(value_1)d duo %(value_2)d single',
+           [('value_1', 2), ('value_2', 1)]),
+          ((2,), '%(value_1)d quartet %(value_2)d duo',
+           [('value_1', 2), ('value_2', 1)])])
+
+    Structures without final ``None`` limit are incorrect:
+
+        >>> _mk_fancy_table(((2, 1, (u'A', {})), ))
+        Traceback (most recent call last):
+        ...
+        TypeError: formatting structure is incorrect
+
+    """
+    try:
+        first_factor = structure[0][1]
+        limits, rows = [], []
+        cumulated = 1.0
+        divisors = []
+        for limit, factor, fmt in structure:
+            if factor != 1:  ## dividing by 1 is a no-op
+                divisors.append(factor)
+            if len(fmt) == 3:
+                msg, scales, order = fmt
+            else:
+                msg, scales = fmt
+                order = sorted(scales.keys())
+            rows.append((tuple(divisors), msg,
+                         [(key, scales[key]) for key in order]))
+            if not limit:
+                break
+            cumulated *= limit
+            limits.append(cumulated)
+        else:
+            raise TypeError("no final limit")
+        first_factor / 1.0  ## must be a number
+    except (TypeError, ValueError, KeyError, IndexError):
+        raise TypeError("formatting structure is incorrect")
+    return first_factor, limits, rows
+
+
 class LogNumberFormatter(Formatter):
     """Logarithmic number formatter factory.
 
@@ -861,41 +1441,129 @@ class LogNumberFormatter(Formatter):
 
     """
 
+    _units_table = None
+
+    def _get_units_table(self, context):
+        """Returns units table for ``context``, caching the last one"""
+        units, precision = context['units'], context.get('precision', 1)
+        cached = self._units_table
+        if cached is None or cached[0] is not units or \
+               cached[1] != precision:
+            cached = (units, precision, _mk_log_units(units, precision))
+            self._units_table = cached
+        return cached[2]
+
     def format(self, value, context=None):
-        precision = int(context.get('precision', 1))
+        thresholds, rows, nb_units = self._get_units_table(context)
 
         ## generates exception if not integer
         value = int(value)
 
-        if precision < 0:
-            raise ValueError("Negative precision '%d' is not coherent."
-                             % precision)
-
-        def _format(value, suffix, precision, auth_prec):
-            """Takes care of the final formatting ..."""
-            prec = min(auth_prec, precision)
-            if prec == 0:
-                format_string = u"%i"
-            else:
-                format_string = u"%." + str(prec) + "f"
-            return (format_string % value, suffix)
+        (fmt, suffix, idx, factor, divisor) = rows[
+            nb_units if value < 0 else
+            bisect.bisect_right(thresholds, value)]
+        if divisor:
+            value = float(value) / divisor
+        else:
+            for _ in range(idx):  ## same float rounding than iteratively
+                value = float(value) / factor
+        return (fmt % value, suffix)
 
-        suffixes, factor = context['units']
+    def format_many(self, values, context=None, **kwargs):
+        """Format all ``values`` at once
 
-        ## raise error if suffixes is not iterable
-        iter(suffixes)
+        Unit of each value is found by bisecting the unit thresholds, all
+        at once if ``values`` is a numpy array:
 
-        auth_prec = 0
-        suffix = u''  ## default value if suffixes is empty
-        for suffix in suffixes:
-            if 0 <= value < factor:
-                return _format(value, suffix, precision, auth_prec)
+            >>> format_size = LogNumberFormatter(
+            ...   units=(["B", "KiB", "MiB"], 2**10))
+            >>> format_size.format_many([0, 35, 1500, 2047, 2**30, -1])
+            [('0', 'B'), ('35', 'B'), ('1.5', 'KiB'), ('2.0', 'KiB'),
+             ('1024.0', 'MiB'), ('-0.0', 'MiB')]
 
-            last_value = value  ## keep in case of last loop
-            value = float(value) / factor
-            auth_prec += int(math.log(factor, 10))
+        """
+        context = self._get_context(context, **kwargs)
+        thresholds, rows, nb_units = self._get_units_table(context)
+
+        numpy = _numpy_of(values)
+        if numpy is None:
+            values = [int(value) for value in values]
+            steps = [nb_units if value < 0 else
+                     bisect.bisect_right(thresholds, value)
+                     for value in values]
+        else:
+            values = values.astype(numpy.int64)
+            ## thresholds not fitting in int64 can't be reached
+            imax = numpy.iinfo(numpy.int64).max
+            steps = numpy.searchsorted(
+                numpy.array([t for t in thresholds if t <= imax]),
+                values, side='right')
+            steps[values < 0] = nb_units
+            values, steps = values.tolist(), steps.tolist()
+
+        res = []
+        for value, nb_steps in zip(values, steps):
+            (fmt, suffix, idx, factor, divisor) = rows[nb_steps]
+            if divisor:
+                value = float(value) / divisor
+            else:
+                for _ in range(idx):
+                    value = float(value) / factor
+            res.append((fmt % value, suffix))
+        return res
+
+
+def _mk_log_units(units, precision):
+    """Returns precomputed table to format numbers in given units
+
+    Returns ``(thresholds, rows, nb_units)``. Thresholds are the powers
+    of the factor: ``bisect_right(thresholds, value)`` is the number
+    of divisions by the factor to get ``value`` below the factor, or
+    ``nb_units`` if ``value`` is over the scale.
+
+    Each row holds the format string, the suffix, the number of
+    divisions to apply, and the factor. If the factor is a power of 2,
+    the whole division is precomputed as it gives the exact same
+    float than successive divisions.
+
+        >>> thresholds, rows, nb_units = _mk_log_units(
+        ...     (["B", "KB", "MB"], 1000), 1)
+        >>> thresholds
+        [1000, 1000000, 1000000000]
+        >>> for row in rows: print(row)
+        ('%i', 'B', 0, 1000, None)
+        ('%.1f', 'KB', 1, 1000, None)
+        ('%.1f', 'MB', 2, 1000, None)
+        ('%.1f', 'MB', 2, 1000, None)
 
-        return _format(last_value, suffix, precision, auth_prec)
+    """
+    precision = int(precision)
+    if precision < 0:
+        raise ValueError("Negative precision '%d' is not coherent."
+                         % precision)
+
+    suffixes, factor = units
+    ## raise error if suffixes is not iterable
+    suffixes = list(suffixes)
+    nb_units = len(suffixes)
+    if nb_units == 0:
+        raise ValueError("No units provided.")
+
+    exact = isinstance(factor, int) and factor > 0 and \
+            factor & (factor - 1) == 0
+    ## authorized precision gained on each division
+    step = int(math.log(factor, 10))
+
+    thresholds = [factor ** i for i in range(1, nb_units + 1)]
+    rows = []
+    for nb_steps in range(nb_units + 1):
+        ## over the scale, values are written in the last unit
+        idx = min(nb_steps, nb_units - 1)
+        prec = min(nb_steps * step, precision)
+        rows.append((u"%i" if prec == 0 else u"%%.%df" % prec,
+                     suffixes[idx], idx, factor,
+                     factor ** idx if exact and idx else None))
+    return thresholds, rows, nb_units
 
 
 class PercentFormatter(Formatter):
@@ -935,6 +1603,29 @@ class PercentFormatter(Formatter):
             return value * precision
         raise ValueError("Need an integer or float value.")
 
+    def format_many(self, values, context=None, **kwargs):
+        """Format all ``values`` at once
+
+        On numpy arrays, this is only one multiplication, and a list is
+        returned as well:
+
+            >>> PercentFormatter().format_many([0.2, -1, 5])
+            [20.0, -100, 500]
+
+        """
+        context = self._get_context(context, **kwargs)
+        precision = int(context.get('precision', 100))
+        numpy = _numpy_of(values)
+        if numpy is not None:
+            ## booleans are integers, as in ``format``
+            if values.dtype.kind not in "biuf":
+                raise ValueError("Need an integer or float value.")
+            if values.dtype.kind in "biu" and values.dtype.itemsize < 8:
+                values = values.astype(numpy.int64)  ## avoids overflows
+            return (values * precision).tolist()
+        format = self.format
+        return [format(value, context) for value in values]
+
 
 def mk_fmt(fun):
 
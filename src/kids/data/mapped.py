@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""Read-only nested dict stored in a memory-mappable file
+
+A nested dict is stored as a table of its leaves sorted on their flat
+keys, so that any section is a contiguous range of the table:
+
+    >>> from kids.data.mapped import dumps, loads
+    >>> buf = dumps({'a': {'x': 1, 'y': [1, 2]}, 'b': u'foo', 'c': None})
+
+    >>> d = loads(buf)
+    >>> d['a.x']
+    1
+    >>> d['a.y.1']
+    2
+    >>> d['a']
+    <MappedDict 'a' (2 keys)>
+    >>> sorted(d['a'].items())
+    [('x', 1), ('y', [1, 2])]
+
+Values are only decoded when accessed, and paths are resolved by binary
+search on the keys of the table. So ``load`` can memory-map a file
+instead of reading it, the OS sharing its pages between processes.
+
+Keys must be strings. Leaves can be ``None``, booleans, numbers,
+strings, bytes, empty dicts, or any other JSON serializable values.
+
+"""
+
+import sys
+import json
+import mmap
+import array
+import struct
+import numbers
+
+try:
+    from collections.abc import Mapping
+except ImportError:  ## pragma: no cover
+    from collections import Mapping  ## PY2
+
+from .mdict import CharTokenizer, MissingKeyError, aget
+
+
+## Python 3 compatibility layer
+try:
+    unicode = unicode
+except NameError:  ## pragma: no cover
+    # 'unicode' is undefined, must be Python 3
+    unicode = str
+    bytes = bytes
+    basestring = (str, bytes)
+else:  ## pragma: no cover
+    # 'unicode' exists, must be Python 2
+    bytes = str
+    basestring = basestring
+
+
+MAGIC = b"KDMAPPD1"
+HEADER = struct.Struct("<8sQQ")  ## magic, nb of leaves, keys blob size
+
+## Tokens of a flat key are separated by NUL, the smallest byte, so that
+## all keys of a section immediately follow the key of the section.
+SEP = b"\x00"
+
+
+##
+## Values
+##
+
+def _encode_value(value):
+    """Returns type code and bytes of ``value``
+
+        >>> _encode_value(3)
+        (b'i', b'3')
+        >>> _encode_value(u'\\xe9')
+        (b's', b'\\xc3\\xa9')
+
+    """
+    if value is None:
+        return b"n", b""
+    if value is True or value is False:
+        return (b"t" if value else b"f"), b""
+    if isinstance(value, numbers.Integral):
+        return b"i", str(value).encode("ascii")
+    if isinstance(value, float):
+        return b"r", struct.pack("<d", value)
+    if isinstance(value, unicode):
+        return b"s", value.encode("utf-8")
+    if isinstance(value, bytes):
+        return b"b", value
+    if isinstance(value, dict) and not value:
+        return b"d", b""
+    return b"j", json.dumps(value, sort_keys=True).encode("utf-8")
+
+
+def _decode_value(code, data):
+    if code == b"s":
+        return data.decode("utf-8")
+    if code == b"i":
+        return int(data)
+    if code == b"r":
+        return struct.unpack("<d", data)[0]
+    if code == b"n":
+        return None
+    if code in (b"t", b"f"):
+        return code == b"t"
+    if code == b"b":
+        return bytes(data)
+    if code == b"d":
+        return {}
+    return json.loads(data.decode("utf-8"))
+
+
+##
+## Writing
+##
+
+def _leaves(dct, prefix=()):
+    """Yields (tokens, value) of all leaves of nested dict ``dct``"""
+    for k, v in dct.items():
+        if not isinstance(k, unicode):
+            raise TypeError("Only string keys can be stored (got %r)." % (k, ))
+        if isinstance(v, dict) and v:
+            for leaf in _leaves(v, prefix + (k, )):
+                yield leaf
+        else:
+            yield prefix + (k, ), v
+
+
+def _encode_key(tokens):
+    encoded = [token.encode("utf-8") for token in tokens]
+    if any(SEP in token for token in encoded):
+        raise ValueError("Keys can't contain NUL characters (got %r)."
+                         % (tokens, ))
+    return SEP.join(encoded)
+
+
+def dumps(dct):
+    """Returns the bytes of the table of nested dict ``dct``
+
+    Layout is a header, the offsets of the keys and of the values (as
+    little-endian 64 bits integers, all relative to the start), the type
+    code of each value, then the keys and values:
+
+        >>> buf = dumps({'a': {'b': 1}})
+        >>> len(buf), buf[-5:]
+        (61, b'ia\\x00b1')
+
+    """
+    leaves = sorted((_encode_key(tokens), _encode_value(value))
+                    for tokens, value in _leaves(dct))
+    nb = len(leaves)
+    keys_size = sum(len(key) for key, _ in leaves)
+    offset = HEADER.size + 2 * 8 * (nb + 1) + nb
+    key_offsets, value_offsets = array.array('Q'), array.array('Q')
+    for key, _ in leaves:
+        key_offsets.append(offset)
+        offset += len(key)
+    key_offsets.append(offset)
+    for _, (_, data) in leaves:
+        value_offsets.append(offset)
+        offset += len(data)
+    value_offsets.append(offset)
+    if sys.byteorder != "little":  ## pragma: no cover
+        key_offsets.byteswap()
+        value_offsets.byteswap()
+    return b"".join(
+        [HEADER.pack(MAGIC, nb, keys_size),
+         _tobytes(key_offsets), _tobytes(value_offsets),
+         b"".join(code for _, (code, _) in leaves)] +
+        [key for key, _ in leaves] +
+        [data for _, (_, data) in leaves])
+
+
+def _tobytes(arr):
+    if hasattr(arr, "tobytes"):
+        return arr.tobytes()
+    return arr.tostring()  ## pragma: no cover
+
+
+def dump(dct, f):
+    """Writes the table of nested dict ``dct`` in binary file ``f``"""
+    f.write(dumps(dct))
+
+
+##
+## Reading
+##
+
+class _Table(object):
+    """Access to the leaves of a table stored in ``buf``"""
+
+    __slots__ = ("buf", "nb", "key_offsets", "value_offsets", "types")
+
+    def __init__(self, buf):
+        magic, nb, _keys_size = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a kids.data mapped table.")
+        self.buf = buf
+        self.nb = nb
+        start = HEADER.size
+        self.key_offsets = self._offsets(start, nb + 1)
+        start += 8 * (nb + 1)
+        self.value_offsets = self._offsets(start, nb + 1)
+        start += 8 * (nb + 1)
+        self.types = buf[start:start + nb]
+
+    def _offsets(self, start, nb):
+        view = memoryview(self.buf)[start:start + 8 * nb]
+        if sys.byteorder == "little" and hasattr(view, "cast"):
+            return view.cast("Q")  ## no copy
+        offsets = array.array('Q', bytes(view))  ## pragma: no cover
+        if sys.byteorder != "little":  ## pragma: no cover
+            offsets.byteswap()
+        return offsets  ## pragma: no cover
+
+    def key(self, i):
+        return self.buf[self.key_offsets[i]:self.key_offsets[i + 1]]
+
+    def value(self, i):
+        return _decode_value(
+            self.types[i:i + 1],
+            self.buf[self.value_offsets[i]:self.value_offsets[i + 1]])
+
+    def lower_bound(self, key, lo, hi):
+        """Returns index of first key not lower than ``key``"""
+        key_offsets, buf = self.key_offsets, self.buf
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if buf[key_offsets[mid]:key_offsets[mid + 1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class MappedDict(Mapping):
+    r"""Read-only ``mdict`` on a range of the leaves of a table
+
+    Its keys are those of ``mdict``, which is also its ``tokenizer``:
+
+        >>> d = loads(dumps({'a.b': {'c': 1}, 'e': {}}))
+        >>> list(d)
+        ['a\\.b', 'e']
+        >>> d[r'a\.b.c']
+        1
+        >>> d['e']
+        {}
+        >>> d['a']
+        Traceback (most recent call last):
+        ...
+        MissingKeyError: missing key 'a' in dict.
+        >>> d[r'a\.b.c.d']
+        Traceback (most recent call last):
+        ...
+        NonDictLikeTypeError: can't query subvalue 'd' of a leaf (leaf value is 1).
+
+    ``flat`` and ``to_dict`` give the whole content as python objects:
+
+        >>> d.flat == {r'a\.b.c': 1}
+        True
+        >>> d.to_dict() == {'a.b': {'c': 1}, 'e': {}}
+        True
+
+    """
+
+    def __init__(self, table, lo=0, hi=None, path=(),
+                 tokenizer=CharTokenizer(".")):
+        self._table = table
+        self._lo = lo
+        self._hi = table.nb if hi is None else hi
+        self._path = path
+        self._prefix = _encode_key(path) + SEP if path else b""
+        self.tokenizer = tokenizer
+
+    def _lookup(self, tokens):
+        """Returns the value or sub-range of ``tokens`` in this range
+
+        If ``tokens`` go through a leaf, the rest of the tokens are used
+        to query it.
+
+        """
+        table = self._table
+        key = self._prefix + _encode_key(tokens)
+        idx = table.lower_bound(key, self._lo, self._hi)
+        if idx < self._hi and table.key(idx) == key:
+            return table.value(idx)
+        lo = table.lower_bound(key + SEP, idx, self._hi)
+        hi = table.lower_bound(key + b"\x01", lo, self._hi)
+        if lo < hi:
+            return MappedDict(table, lo, hi, self._path + tuple(tokens),
+                              self.tokenizer)
+        ## Search the deepest existing parent
+        for nb in range(len(tokens) - 1, 0, -1):
+            key = self._prefix + _encode_key(tokens[:nb])
+            idx = table.lower_bound(key, self._lo, self._hi)
+            if idx == self._hi:
+                continue
+            found = table.key(idx)
+            if found == key:
+                return aget(table.value(idx), tokens[nb:])
+            if found.startswith(key + SEP):
+                break
+        else:
+            nb = 0
+        raise MissingKeyError("missing key %r in dict." % (tokens[nb], ))
+
+    def __getitem__(self, label):
+        return self._lookup(list(self.tokenizer.tokenize(label)))
+
+    def _children(self):
+        """Yields first token of keys in range, and their index"""
+        table, lo, prefix = self._table, self._lo, self._prefix
+        start = len(prefix)
+        while lo < self._hi:
+            token = table.key(lo)[start:].split(SEP, 1)[0]
+            yield token.decode("utf-8"), lo
+            lo = table.lower_bound(prefix + token + b"\x01", lo + 1,
+                                   self._hi)
+
+    def __iter__(self):
+        quote = self.tokenizer.quote
+        for token, _ in self._children():
+            yield quote(token)
+
+    def __len__(self):
+        return sum(1 for _ in self._children())
+
+    def __repr__(self):
+        return "<MappedDict %r (%d keys)>" % (
+            self.tokenizer.untokenize(list(self._path)) if self._path
+            else "", len(self))
+
+    def _leaves(self):
+        table, start = self._table, len(self._prefix)
+        for i in range(self._lo, self._hi):
+            tokens = [token.decode("utf-8")
+                      for token in table.key(i)[start:].split(SEP)]
+            yield tokens, table.value(i)
+
+    @property
+    def flat(self):
+        untokenize = self.tokenizer.untokenize
+        return dict((untokenize(tokens), value)
+                    for tokens, value in self._leaves()
+                    if value != {})  ## as ``mdict.flat``
+
+    def to_dict(self):
+        res = {}
+        for tokens, value in self._leaves():
+            dct = res
+            for token in tokens[:-1]:
+                dct = dct.setdefault(token, {})
+            dct[tokens[-1]] = value
+        return res
+
+
+def loads(buf, tokenizer=CharTokenizer(".")):
+    """Returns the ``MappedDict`` of a table stored in ``buf``"""
+    return MappedDict(_Table(buf), tokenizer=tokenizer)
+
+
+def load(filename, tokenizer=CharTokenizer(".")):
+    """Returns the ``MappedDict`` of a table file, memory-mapping it"""
+    with open(filename, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(buf, tokenizer=tokenizer)
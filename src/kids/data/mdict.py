@@ -6,6 +6,9 @@ import collections
 
 from kids.cache import cache, hippie_hashing
 
+from . import stats
+from .trie import Trie
+from .fingerprint import Fingerprints
 from .dct import DictLikeAbstract, is_dict_like
 
 
@@ -108,6 +111,32 @@ def mk_sep_fun(sep, strip=True, quote_char="\\"):
     return sep_fun
 
 
+def mk_quote_fun(sep, quote_char="\\"):
+    r"""Create a function quoting ``sep`` and ``quote_char`` in strings
+
+        >>> quote = mk_quote_fun(".")
+        >>> quote('a.b')
+        'a\\.b'
+        >>> quote('a')
+        'a'
+
+    """
+    prepare = {
+        'sc': re.escape(sep),
+        'qc': re.escape(quote_char),
+    }
+
+    quote_chars = re.compile(r'(%(qc)s|%(sc)s)' % prepare)
+    repl = r'%(qc)s\1' % prepare
+
+    def quote(s):
+        if sep in s or quote_char in s:
+            return quote_chars.sub(repl, s)
+        return s
+
+    return quote
+
+
 def mk_join_fun(sep, quote_char="\\"):
     r"""Create a standard join string keys with given sep
 
@@ -155,15 +184,7 @@ def mk_join_fun(sep, quote_char="\\"):
 
     """
 
-    prepare = {
-        'sc': re.escape(sep),
-        'qc': re.escape(quote_char),
-    }
-
-    quote_chars = re.compile(r'(%(qc)s|%(sc)s)' % prepare)
-
-    def quote(s):
-        return quote_chars.sub(r'%(qc)s\1' % prepare, s)
+    quote = mk_quote_fun(sep, quote_char)
 
     def join_fun(key, value, final):
         """Return the join key and value
@@ -191,7 +212,8 @@ def classify(values, sep_fun, deep=-1):
         ...         return None, value, True
         ...     tailv = value / primes[0]
         ...     return primes[0], int(tailv), tailv == 1
-        >>> classify([6, 9, 15, 20, 32], sep_fun)
+        >>> from pprint import pprint as pp
+        >>> pp(classify([6, 9, 15, 20, 32], sep_fun))
         {2: {2: {2: {2: {2: 1}}, 5: 1}, 3: 1}, 3: {3: 1, 5: 1}}
 
     Note that we can classify all these numbers only because none
@@ -368,7 +390,7 @@ def mk_tokenize_from_sep_fun(sep):
     def tokenize(s):
         for token in tokenizing((s, End)):
             if token is End:
-                raise StopIteration
+                return
             yield token
 
     return tokenize
@@ -443,9 +465,26 @@ def mk_char_tokenizer(split_char, quote_char='\\'):
     #     []
 
 
+    Keys without any quote char are simply split:
+
+        >>> list(tokenize('a.b')), list(tokenize(r'a\.b'))
+        (['a', 'b'], ['a.b'])
+
     """
-    return mk_tokenize_from_sep_fun(
-        mk_sep_fun(split_char, quote_char=quote_char))
+    return _mk_split_fast_path(
+        mk_tokenize_from_sep_fun(mk_sep_fun(split_char, quote_char=quote_char)),
+        split_char, quote_char)
+
+
+def _mk_split_fast_path(tokenize, split_char, quote_char):
+    """Returns ``tokenize`` using ``str.split`` on keys without quoting"""
+
+    def fast_tokenize(s):
+        if quote_char in s:
+            return tokenize(s)
+        return iter(s.split(split_char))
+
+    return fast_tokenize
 
 
 def mget(dct, key, tokenize=mk_char_tokenizer(".")):
@@ -528,6 +567,8 @@ def mget(dct, key, tokenize=mk_char_tokenizer(".")):
     #     {'a': 1}
 
     """
+    if stats.enabled:
+        stats.incr("mdict.tokenize")
     return aget(dct, tokenize(key))
 
 
@@ -576,6 +617,8 @@ def aget(dct, key):
     except StopIteration:
         return dct
 
+    if stats.enabled:
+        stats.incr("mdict.aget.nodes")
     if isinstance(dct, list):
         try:
             idx = int(head)
@@ -647,6 +690,8 @@ def mset(dct, key, value, tokenize=mk_char_tokenizer(".")):
         {'a': {'b': {'z': 9}}, 'x': 1}
 
     """
+    if stats.enabled:
+        stats.incr("mdict.tokenize")
     last = Null
     token = None
     for token in tokenize(key):
@@ -690,6 +735,8 @@ def mdel(dct, key, tokenize=mk_char_tokenizer(".")):
         KeyError: 'z'
 
     """
+    if stats.enabled:
+        stats.incr("mdict.tokenize")
     last = Null
     token = None
     for token in tokenize(key):
@@ -699,6 +746,231 @@ def mdel(dct, key, tokenize=mk_char_tokenizer(".")):
     del dct[token]
 
 
+def _group(entries, depth):
+    """Returns entries grouped on their token at ``depth``"""
+    groups = {}
+    for entry in entries:
+        tokens = entry[0]
+        if tokens[depth] in groups:
+            groups[tokens[depth]].append(entry)
+        else:
+            groups[tokens[depth]] = [entry]
+    return groups.items()
+
+
+def _child(dct, token, create):
+    try:
+        return aget(dct, (token, ))
+    except MissingKeyError:
+        if not create:
+            raise
+        dct[token] = {}
+        return dct[token]
+
+
+def _apply(dct, entries, depth, create):
+    """Sets (``create``) or deletes ``entries`` as done one by one
+
+    Entries of a same key are applied in order, those of its sub keys
+    being applied together in between.
+
+    """
+    for token, group in _group(entries, depth):
+        pending = []
+        for entry in group:
+            if len(entry[0]) > depth + 1:
+                pending.append(entry)
+                continue
+            if pending:
+                _apply(_child(dct, token, create), pending, depth + 1, create)
+                pending = []
+            if create:
+                dct[token] = entry[1]
+            else:
+                del dct[token]
+        if pending:
+            _apply(_child(dct, token, create), pending, depth + 1, create)
+
+
+def _check(dct, entries, depth, create):
+    """Raises if ``entries`` can't all be applied on ``dct``
+
+    ``dct`` is ``Null`` for sections that would be created.
+
+    """
+    action = "set" if create else "delete"
+    for token, group in _group(entries, depth):
+        finals = [entry for entry in group if len(entry[0]) == depth + 1]
+        if finals and len(group) > 1:
+            other = group[1] if group[0] is finals[0] else group[0]
+            raise TypeError(
+                "Key %r conflicts with key %r of the same batch."
+                % (finals[0][2], other[2]))
+        if finals:
+            if dct is Null:
+                continue
+            if not is_dict_like(dct):
+                raise NonDictLikeTypeError(
+                    "can't %s key %r of a leaf." % (action, finals[0][2]))
+            if not create and token not in dct:
+                raise MissingKeyError("missing key %r in dict." % (token, ))
+            continue
+        child = Null
+        if dct is not Null:
+            try:
+                child = aget(dct, (token, ))
+            except MissingKeyError:
+                if not create:
+                    raise
+            if child is not Null and not isinstance(child, list) and \
+                    not is_dict_like(child):
+                raise NonDictLikeTypeError(
+                    "can't %s key %r of a leaf." % (action, group[0][2]))
+        _check(child, group, depth + 1, create)
+
+
+def mset_many(dct, items, tokenize=mk_char_tokenizer("."), atomic=False):
+    """Set many values in multiple depth dict
+
+    ``items`` are (key, value) pairs, or a dict of them. The result is
+    the same as calling ``mset`` on each of them, but each section is
+    traversed or created once:
+
+        >>> from pprint import pprint as pp
+        >>> dct = {'a': {'x': 1}}
+        >>> mset_many(dct, [('a.y', 2), ('b.c.d', 3), ('b.c.e', 4)])
+        >>> pp(dct)
+        {'a': {'x': 1, 'y': 2}, 'b': {'c': {'d': 3, 'e': 4}}}
+
+    With ``atomic``, the whole batch is validated before any change.
+    A key can't then be set twice, or along with its sub keys (as in
+    ``classify``):
+
+        >>> mset_many(dct, [('z', 1), ('a.x.y', 2)], atomic=True)
+        Traceback (most recent call last):
+        ...
+        NonDictLikeTypeError: can't set key 'a.x.y' of a leaf.
+        >>> mset_many(dct, [('z', 1), ('z.y', 2)], atomic=True)
+        Traceback (most recent call last):
+        ...
+        TypeError: Key 'z' conflicts with key 'z.y' of the same batch.
+        >>> 'z' in dct
+        False
+
+    Leaves can't be traversed, even if they are ``None``:
+
+        >>> dct = {'a': None}
+        >>> mset_many(dct, [('b', 1), ('a.x', 2)], atomic=True)
+        Traceback (most recent call last):
+        ...
+        NonDictLikeTypeError: can't set key 'a.x' of a leaf.
+        >>> dct
+        {'a': None}
+
+    """
+    if is_dict_like(items):
+        items = items.items()
+    entries = [(list(tokenize(key)), value, key) for key, value in items]
+    if stats.enabled:
+        stats.incr("mdict.tokenize", len(entries))
+    if atomic:
+        _check(dct, entries, 0, True)
+    _apply(dct, entries, 0, True)
+
+
+def mdel_many(dct, keys, tokenize=mk_char_tokenizer("."), atomic=False):
+    """Delete many values in multiple depth dict
+
+    As calling ``mdel`` on each of ``keys``:
+
+        >>> dct = {'a': {'x': 1, 'y': 2, 'z': 3}, 'b': 4}
+        >>> mdel_many(dct, ['a.x', 'a.y', 'b'])
+        >>> dct
+        {'a': {'z': 3}}
+
+    With ``atomic``, nothing is deleted if one key is missing:
+
+        >>> mdel_many(dct, ['a.z', 'c'], atomic=True)
+        Traceback (most recent call last):
+        ...
+        MissingKeyError: missing key 'c' in dict.
+        >>> dct
+        {'a': {'z': 3}}
+
+    """
+    entries = [(list(tokenize(key)), None, key) for key in keys]
+    if stats.enabled:
+        stats.incr("mdict.tokenize", len(entries))
+    if atomic:
+        _check(dct, entries, 0, False)
+    _apply(dct, entries, 0, False)
+
+
+def compile_path(key, tokenize=mk_char_tokenizer(".")):
+    """Returns a function getting the value of ``key`` in its argument
+
+    It is equivalent to ``mget`` with a fixed key, but ``key`` is only
+    tokenized once:
+
+        >>> get_city = compile_path('user.addresses.0.city')
+        >>> get_city({'user': {'addresses': [{'city': 'Paris'}]}})
+        'Paris'
+
+    Same exceptions as ``mget`` are raised:
+
+        >>> get_city({'user': {'addresses': []}})
+        Traceback (most recent call last):
+        ...
+        IndexOutOfRange: index 0 is out of range (0 elements in list).
+
+    """
+    tokens = list(tokenize(key))
+    steps = []
+    for token in tokens:
+        try:
+            steps.append((token, int(token)))
+        except ValueError:
+            steps.append((token, None))
+
+    def get(dct):
+        value = dct
+        try:
+            for token, idx in steps:
+                if type(value) is dict:
+                    value = value[token]
+                elif type(value) is list and idx is not None:
+                    value = value[idx]
+                else:
+                    break
+            else:
+                return value
+        except (KeyError, IndexError, TypeError):
+            pass
+        ## slow path on other types, and for errors
+        return aget(dct, tokens)
+
+    return get
+
+
+def compile_paths(keys, tokenize=mk_char_tokenizer(".")):
+    """Returns a function getting the tuple of values of ``keys``
+
+    As ``operator.itemgetter`` with ``mget``:
+
+        >>> project = compile_paths(['a.b', 'c'])
+        >>> [project(r) for r in [{'a': {'b': 1}, 'c': 2},
+        ...                       {'a': {'b': 3}, 'c': 4}]]
+        [(1, 2), (3, 4)]
+
+    """
+    getters = [compile_path(key, tokenize) for key in keys]
+
+    def get(dct):
+        return tuple([getter(dct) for getter in getters])
+
+    return get
+
+
 Tokenizer = collections.namedtuple(
     'Tokenizer',
     ["split", "join",
@@ -707,36 +979,313 @@ Tokenizer = collections.namedtuple(
 
 
 class CharTokenizer(object):
+    r"""Tokenizer of keys separated by ``sep``
+
+    Its functions are built once at instantiation:
+
+        >>> tokenizer = CharTokenizer("/")
+        >>> list(tokenizer.tokenize(r'a/b\/c'))
+        ['a', 'b/c']
+        >>> tokenizer.untokenize(['a', 'b/c'])
+        'a/b\\/c'
+        >>> tokenizer.quote('b/c')
+        'b\\/c'
+        >>> tokenizer.unquote(r'b\/c')
+        'b/c'
+
+    Keys are only processed if they contain ``sep`` or ``quote_char``,
+    and can be quoted in bulk:
+
+        >>> tokenizer.quote_many(['a', 'b/c'])
+        ['a', 'b\\/c']
+
+    """
+
+    __slots__ = ("sep", "quote_char", "quote",
+                 "split", "join", "tokenize", "untokenize")
 
     def __init__(self, sep, quote_char="\\"):
         self.sep = sep
         self.quote_char = quote_char
+        self.quote = mk_quote_fun(sep, quote_char)
+        self.split = mk_sep_fun(sep, quote_char=quote_char)
+        self.join = mk_join_fun(sep, quote_char)
+        self.tokenize = _mk_split_fast_path(
+            mk_tokenize_from_sep_fun(self.split), sep, quote_char)
+        self.untokenize = mk_untokenize_from_join_fun(self.join)
+
+    def quote_many(self, keys):
+        sep, quote_char, quote = self.sep, self.quote_char, self.quote
+        return [quote(k) if sep in k or quote_char in k else k
+                for k in keys]
 
-    @cache
-    @property
-    def split(self):
-        return mk_sep_fun(self.sep, self.quote_char)
+    def unquote(self, k):
+        if self.sep in k or self.quote_char in k:
+            return next(self.tokenize(k))
+        return k
 
-    @cache
-    @property
-    def join(self):
-        return mk_join_fun(self.sep, self.quote_char)
 
-    @cache
-    @property
-    def tokenize(self):
-        return mk_tokenize_from_sep_fun(self.split)
+## Kinds of steps of a compiled pattern
+_KEY, _ANY, _DEEP, _SLICE = "key", "any", "deep", "slice"
 
-    @cache
-    @property
-    def untokenize(self):
-        return mk_untokenize_from_join_fun(self.join)
+_SLICE_REGEX = re.compile(r"^(-?\d*):(-?\d*)(?::(-?\d*))?$")
 
-    def quote(self, k):
-        return self.untokenize([k])
 
-    def unquote(self, k):
-        return self.tokenize(k).next()
+def _split_pattern(pattern, sep, quote_char):
+    r"""Returns tokens of ``pattern``, leaving them quoted
+
+        >>> _split_pattern(r'a.\*.b\.c', '.', '\\')
+        ['a', '\\*', 'b\\.c']
+
+    """
+    tokens, acc, quoted = [], [], False
+    for char in pattern:
+        if quoted:
+            quoted = False
+        elif char == quote_char:
+            quoted = True
+        elif char == sep:
+            tokens.append("".join(acc))
+            acc = []
+            continue
+        acc.append(char)
+    tokens.append("".join(acc))
+    return tokens
+
+
+def _compile_step(raw, unquote):
+    if raw == "*":
+        return _ANY, None
+    if raw == "**":
+        return _DEEP, None
+    token = unquote(raw)
+    match = _SLICE_REGEX.match(raw)
+    if match:
+        return _SLICE, (token, slice(*[int(n) if n else None
+                                       for n in match.groups()]))
+    try:
+        return _KEY, (token, int(token))
+    except ValueError:
+        return _KEY, (token, None)
+
+
+@cache
+def mk_select_fun(pattern, sep=".", quote_char="\\"):
+    """Returns a function yielding (flat key, value) matching ``pattern``
+
+    The pattern is compiled once in a set of states (as an automaton),
+    and the returned function walks a nested structure only once,
+    following only children that can still match.
+
+        >>> select = mk_select_fun('a.*.port')
+        >>> list(select({'a': {'x': {'port': 1}, 'y': {}}, 'b': 2}))
+        [('a.x.port', 1)]
+
+    """
+    unquote = mk_solid_split(sep, quote_char)
+    quote = mk_quote_fun(sep, quote_char)
+    steps = [_compile_step(raw, unquote)
+             for raw in _split_pattern(pattern, sep, quote_char)]
+    final = len(steps)
+    literals = {}  ## states -> literal keys, or None if not only literals
+
+    closures = {}
+
+    def close(states):
+        """Adds states reachable by ``**`` matching no level"""
+        states = frozenset(states)
+        if states in closures:
+            return closures[states]
+        res, todo = set(), list(states)
+        while todo:
+            state = todo.pop()
+            if state not in res:
+                res.add(state)
+                if state < final and steps[state][0] is _DEEP:
+                    todo.append(state + 1)
+        res = closures[states] = frozenset(res)
+        return res
+
+    def get_literals(states):
+        if states not in literals:
+            keys = []
+            for state in states:
+                if state == final:
+                    continue
+                kind, arg = steps[state]
+                if kind is not _KEY:
+                    keys = None
+                    break
+                keys.append(arg)
+            literals[states] = keys
+        return literals[states]
+
+    def children(node, states):
+        """Yields token, child, and next states of matching children"""
+        is_list = isinstance(node, list)
+        if not is_list and not (type(node) is dict or is_dict_like(node)):
+            return
+        keys = get_literals(states)
+        if keys is None:
+            items = enumerate(node) if is_list else node.items()
+        elif is_list:
+            size = len(node)
+            items = [(idx % size, node[idx]) for _, idx in keys
+                     if idx is not None and -size <= idx < size]
+        else:
+            items = [(key, node[key]) for key, _ in keys if key in node]
+        ranges = {}
+        for key, child in items:
+            nexts = set()
+            for state in states:
+                if state == final:
+                    continue
+                kind, arg = steps[state]
+                if kind is _DEEP:
+                    nexts.add(state)
+                elif kind is _ANY:
+                    nexts.add(state + 1)
+                elif is_list:
+                    if kind is _KEY:
+                        if arg[1] is not None and key == arg[1] % len(node):
+                            nexts.add(state + 1)
+                    else:
+                        if state not in ranges:
+                            ranges[state] = range(*arg[1].indices(len(node)))
+                        if key in ranges[state]:
+                            nexts.add(state + 1)
+                elif key == arg[0]:
+                    nexts.add(state + 1)
+            if nexts:
+                yield (str(key) if is_list else quote(key)), child, \
+                    close(nexts)
+
+    start = close([0])
+
+    def select(dct):
+        stack = [(None, dct, start)]
+        while stack:
+            key, node, states = stack.pop()
+            if stats.enabled:
+                stats.incr("mdict.select.nodes")
+            if key is not None and final in states:
+                yield key, node
+            if len(states) == 1 and final in states:
+                continue
+            prefix = "" if key is None else key + sep
+            stack.extend(reversed([
+                (prefix + token, child, nexts)
+                for token, child, nexts in children(node, states)]))
+
+    return select
+
+
+def mselect(dct, pattern, tokenizer=CharTokenizer(".")):
+    r"""Yields (flat key, value) of all values matching ``pattern``
+
+    Patterns are keys as in ``mget``, where a ``*`` token matches any
+    key of one level:
+
+        >>> dct = {'services': {'web': {'port': 80, 'host': 'w'},
+        ...                     'db': {'port': 5432}}}
+        >>> sorted(mselect(dct, 'services.*.port'))
+        [('services.db.port', 5432), ('services.web.port', 80)]
+
+    And ``**`` any number of levels, including none:
+
+        >>> sorted(mselect(dct, '**.port'))
+        [('services.db.port', 5432), ('services.web.port', 80)]
+        >>> sorted(k for k, v in mselect(dct, 'services.**'))
+        ['services', 'services.db', 'services.db.port', 'services.web',
+         'services.web.host', 'services.web.port']
+
+    Lists can be queried by index or by slice, and keys are always
+    given with positive indexes:
+
+        >>> dct = {'a': [{'b': 0}, {'b': 1}, {'b': 2}]}
+        >>> list(mselect(dct, 'a.1:.b'))
+        [('a.1.b', 1), ('a.2.b', 2)]
+        >>> list(mselect(dct, 'a.-1.b'))
+        [('a.2.b', 2)]
+
+    Quoted tokens are matched literally, and keys are given quoted:
+
+        >>> dct = {'*': {'a.b': 1}, 'c': {'a.b': 2}}
+        >>> list(mselect(dct, r'\*.*'))
+        [('*.a\\.b', 1)]
+
+    Values are yielded as they are found, walking the structure once.
+
+    """
+    return mk_select_fun(pattern, tokenizer.sep, tokenizer.quote_char)(dct)
+
+
+Change = collections.namedtuple("Change", ["op", "key", "old", "new"])
+
+
+def mdiff(old, new, tokenizer=CharTokenizer(".")):
+    r"""Yields ``Change`` from nested dict ``old`` to ``new``
+
+    Both are walked together, and changes are given with their key as
+    in ``mdict``:
+
+        >>> old = {'web': {'port': 80, 'host': 'w'}, 'db': {'port': 5432}}
+        >>> new = {'web': {'port': 8080, 'host': 'w'}, 'a.b': 1}
+        >>> for change in mdiff(old, new):
+        ...     print(change)
+        Change(op='remove', key='db', old={'port': 5432}, new=None)
+        Change(op='add', key='a\\.b', old=None, new=1)
+        Change(op='change', key='web.port', old=80, new=8080)
+
+    Sub dicts that are the same object are not compared, so diffing
+    versions of a structure sharing its unchanged parts only costs
+    the size of the changed parts. Values that are not dict-likes (as
+    lists) are compared as a whole.
+
+    """
+    quote, sep = tokenizer.quote, tokenizer.sep
+    stack = [("", old, new)]
+    while stack:
+        prefix, old, new = stack.pop()
+        for k, v in old.items():
+            key = prefix + quote(k)
+            try:
+                w = new[k]
+            except KeyError:
+                yield Change("remove", key, v, None)
+                continue
+            if v is w:
+                continue
+            if (type(v) is dict or is_dict_like(v)) and \
+                    (type(w) is dict or is_dict_like(w)):
+                stack.append((key + sep, v, w))
+            elif v != w:
+                yield Change("change", key, v, w)
+        for k, w in new.items():
+            if k not in old:
+                yield Change("add", prefix + quote(k), None, w)
+
+
+def mpatch(dct, changes, tokenizer=CharTokenizer(".")):
+    """Applies ``changes`` (as given by ``mdiff``) on nested dict ``dct``
+
+        >>> old = {'a': {'b': 1, 'c': 2}}
+        >>> new = {'a': {'b': 3}, 'd': [4]}
+        >>> mpatch(old, mdiff(old, new))
+        >>> old == new
+        True
+
+    Changes are applied in batch with ``mset_many`` and ``mdel_many``.
+
+    """
+    removed, changed = [], []
+    for change in changes:
+        if change.op == "remove":
+            removed.append(change.key)
+        else:
+            changed.append((change.key, change.new))
+    mdel_many(dct, removed, tokenize=tokenizer.tokenize)
+    mset_many(dct, changed, tokenize=tokenizer.tokenize)
 
 
 class mdict(DictLikeAbstract):
@@ -846,32 +1395,340 @@ class mdict(DictLikeAbstract):
 
     Notice how 'a' has disappeared as it is an empty section.
 
+
+    Sub dicts
+    ---------
+
+    Sub dicts are returned as light views on the original sub dicts.
+    With ``cache_views``, the same view is returned as long as the
+    sub dict is the same object:
+
+        >>> d = mdict({'a': {'b': 1}}, cache_views=True)
+        >>> d['a'] is d['a']
+        True
+        >>> d['a'] = {'b': 2}
+        >>> d['a']
+        m{'b': 2}
+
+    Views of replaced or deleted sub dicts are dropped from the cache:
+
+        >>> for i in range(3):
+        ...     d['a'] = {'b': i}
+        ...     _ = d['a']
+        >>> len(d._views)
+        1
+        >>> del d['a']
+        >>> len(d._views)
+        0
+
+
+    Index
+    -----
+
+    An index of the flat keys can be attached to query them by prefix.
+    It is kept up to date by setting and deleting items of the mdict:
+
+        >>> d = mdict({'a': {'b': 1, 'c': 2}, 'x': 3})
+        >>> index = d.attach_index()
+        >>> index.count('a.')
+        2
+        >>> d['a.d'] = {'e': 4}
+        >>> del d['x']
+        >>> list(index.items('a.'))
+        [('a.b', 1), ('a.c', 2), ('a.d.e', 4)]
+        >>> d['a'] = 5
+        >>> list(index.items())
+        [('a', 5)]
+
+    Including through sub dict views:
+
+        >>> d['a'] = {'b': {}}
+        >>> d['a']['b']['c'] = 6
+        >>> list(index.items())
+        [('a.b.c', 6)]
+
+    Even views made before the index was attached:
+
+        >>> d = mdict({'a': {}})
+        >>> a = d['a']
+        >>> index = d.attach_index()
+        >>> a['b'] = 1
+        >>> list(index.items())
+        [('a.b', 1)]
+
+    Views being labelled by where they were taken from:
+
+        >>> d = mdict({'a': {'b': 1}}, cache_views=True)
+        >>> index = d.attach_index()
+        >>> _ = d['a']
+        >>> d['c'] = d.dct['a']
+        >>> del d['a']
+        >>> d['c']['z'] = 5
+        >>> list(index.items())
+        [('c.b', 1), ('c.z', 5)]
+
+    But changes made directly in ``dct`` are not seen by the index.
+
+
+    Fingerprint
+    -----------
+
+    ``fingerprint`` gives the fingerprint of the content (see
+    ``kids.data.fingerprint``), computed on each access:
+
+        >>> from kids.data.fingerprint import Fingerprints
+        >>> d = mdict({'a': {'b': 1}, 'c': {'d': 2}})
+        >>> before = d.fingerprint
+        >>> d.dct['c']['d'] = 3
+        >>> d.fingerprint == before
+        False
+
+    Giving ``fingerprints`` tracks them instead: they are cached per sub
+    dict, and only the sub dicts leading to a change made through the
+    mdict, or its sub dict views, are computed again. The fingerprint is
+    then also the cache key of ``flat``:
+
+        >>> d = mdict({'a': {'b': 1}, 'c': {'d': 2}},
+        ...           fingerprints=Fingerprints())
+        >>> before = d.fingerprint
+        >>> d['a']['b'] = 3
+        >>> d.fingerprint == before
+        False
+        >>> d['a']['b'] = 1
+        >>> d.fingerprint == before
+        True
+
+    But changes made directly in ``dct`` are then not seen, until
+    ``fingerprints`` are cleared:
+
+        >>> d.dct['c']['d'] = 3
+        >>> d.fingerprint == before
+        True
+        >>> d.fingerprints.clear()
+        >>> d.fingerprint == before
+        False
+
     """
 
-    def __init__(self, dct, tokenizer=CharTokenizer(".")):
+    __slots__ = ("dct", "tokenizer", "_views", "_index", "_fingerprints",
+                 "_parent", "_tracking")
+
+    def __init__(self, dct, tokenizer=CharTokenizer("."),
+                 cache_views=False, fingerprints=None):
         self.dct = dct
         self.tokenizer = tokenizer
+        self._views = {} if cache_views else None
+        self._parent = None  ## (mdict, label) of views
+        ## shared with views, set once an index or fingerprints are given
+        self._tracking = [False]
+        self.index = None
+        self.fingerprints = fingerprints
+
+    @property
+    def index(self):
+        return self._index
+
+    @index.setter
+    def index(self, index):
+        self._index = index
+        if index is not None:
+            self._tracking[0] = True
+
+    @property
+    def fingerprints(self):
+        return self._fingerprints
+
+    @fingerprints.setter
+    def fingerprints(self, fingerprints):
+        self._fingerprints = fingerprints
+        if fingerprints is not None:
+            self._tracking[0] = True
+
+    def attach_index(self, index=None):
+        """Attaches and returns a ``Trie`` index of flat keys
+
+        ``index`` is built from current content if not given.
+
+        """
+        if index is None:
+            index = Trie(unclassify(self.dct, join_fun=self.tokenizer.join))
+        self.index = index
+        return index
+
+    def _unindex(self, label):
+        """Removes ``label`` and its sub keys from index, returns it"""
+        index, tokenizer = self.index, self.tokenizer
+        key = tokenizer.untokenize(list(tokenizer.tokenize(label)))
+        index.delete_prefix(key + tokenizer.sep)
+        if key in index:
+            del index[key]
+        return key
 
     def __getitem__(self, label):
         res = mget(self.dct, label, tokenize=self.tokenizer.tokenize)
-        if is_dict_like(res):
-            res = mdict(res, tokenizer=self.tokenizer)
+        if type(res) is dict or is_dict_like(res):
+            return self._view(res, label)
         return res
 
+    def _view(self, dct, label):
+        views = self._views
+        if views is None:
+            view = mdict(dct, self.tokenizer)
+            view._parent, view._tracking = (self, label), self._tracking
+            return view
+        ## holding ``dct`` in the cache ensures its id is not reused
+        cached = views.get(id(dct))
+        if cached is None or cached[0] is not dct or \
+               cached[1]._parent[1] != label:  ## same dict moved elsewhere
+            if stats.enabled:
+                stats.incr("mdict.views.misses")
+            view = mdict(dct, self.tokenizer, cache_views=True)
+            view._parent, view._tracking = (self, label), self._tracking
+            cached = views[id(dct)] = (dct, view)
+        elif stats.enabled:
+            stats.incr("mdict.views.hits")
+        return cached[1]
+
+    def _tracked_fingerprints(self):
+        """Returns tracked fingerprints of this mdict or of its parents"""
+        node = self
+        while node.fingerprints is None and node._parent is not None:
+            node = node._parent[0]
+        return node.fingerprints
+
+    def _old(self, label):
+        """Returns value replaced by a change of ``label`` if needed
+
+        It is needed to forget its cached fingerprints or views.
+
+        """
+        if self._views is None and not self._tracked_fingerprints():
+            return Null
+        try:
+            return mget(self.dct, label, tokenize=self.tokenizer.tokenize)
+        except (KeyError, IndexError, TypeError, ValueError):
+            return Null
+
+    def _reindex(self, label, value):
+        """Updates index with ``value`` of ``label`` (``Null`` if deleted)"""
+        key = self._unindex(label)
+        if value is Null:
+            return
+        if type(value) is dict or is_dict_like(value):
+            prefix = key + self.tokenizer.sep
+            for k, v in unclassify(value, join_fun=self.tokenizer.join):
+                self.index[prefix + k] = v
+        else:
+            self.index[key] = value
+
+    def _changed(self, label, old, value=Null):
+        """Updates index and fingerprints of this mdict and its parents
+
+        ``label`` was set to ``value``, or deleted if ``Null``. Fingerprints
+        of sub dicts leading to ``label`` are invalidated, and fingerprints
+        and cached views of ``old`` value are forgotten, not to keep it in
+        memory.
+
+        """
+        node = self
+        while True:
+            if node.index is not None:
+                node._reindex(label, value)
+            fingerprints = node.fingerprints
+            if fingerprints:
+                sub, nodes = node.dct, [node.dct]
+                for token in list(node.tokenizer.tokenize(label))[:-1]:
+                    sub = aget(sub, (token, ))
+                    nodes.append(sub)
+                fingerprints.invalidate(*nodes)
+                if old is not Null:
+                    fingerprints.forget(old)
+            if node._views and old is not Null:
+                node._forget_views(old)
+            if node._parent is None:
+                return
+            parent, parent_label = node._parent
+            try:
+                attached = mget(parent.dct, parent_label,
+                                tokenize=parent.tokenizer.tokenize) \
+                    is node.dct
+            except (KeyError, IndexError, TypeError, ValueError):
+                attached = False
+            if not attached:  ## view of a sub dict removed from parent
+                return
+            node, label = parent, parent_label + parent.tokenizer.sep + label
+
+    def _forget_views(self, value):
+        """Drops cached views of ``value`` and of its sub dicts"""
+        views, todo = self._views, [value]
+        while todo:
+            value = todo.pop()
+            if isinstance(value, list):
+                todo.extend(value)
+            elif type(value) is dict or is_dict_like(value):
+                todo.extend(value.values())
+                cached = views.get(id(value))
+                if cached is not None and cached[0] is value:
+                    del views[id(value)]
+
     def __setitem__(self, label, value):
-        return mset(self.dct, label, value, tokenize=self.tokenizer.tokenize)
+        if not self._tracking[0] and self._views is None:
+            mset(self.dct, label, value, tokenize=self.tokenizer.tokenize)
+            return
+        old = self._old(label)
+        mset(self.dct, label, value, tokenize=self.tokenizer.tokenize)
+        self._changed(label, old, value)
 
     def __repr__(self):
         return 'm%s' % pprint.pformat(self.dct)
 
     def __delitem__(self, key):
+        if not self._tracking[0] and self._views is None:
+            mdel(self.dct, key, tokenize=self.tokenizer.tokenize)
+            return
+        old = self._old(key)
         mdel(self.dct, key, tokenize=self.tokenizer.tokenize)
+        self._changed(key, old)
 
     def __iter__(self):
-        for k in self.dct.__iter__():
-            yield self.tokenizer.quote(k)
+        return iter(self.tokenizer.quote_many(self.dct))
+
+    def keys(self):
+        return self.tokenizer.quote_many(self.dct)
+
+    def items(self):
+        quote = self.tokenizer.quote
+        for k, v in self.dct.items():
+            k = quote(k)
+            if type(v) is dict or is_dict_like(v):
+                v = self._view(v, k)
+            yield k, v
+
+    def __len__(self):
+        return len(self.dct)
+
+    def select(self, pattern):
+        """Yields (flat key, value) matching ``pattern`` (see ``mselect``)"""
+        return mselect(self.dct, pattern, self.tokenizer)
+
+    @property
+    def fingerprint(self):
+        fingerprints = self._tracked_fingerprints()
+        if fingerprints is None:
+            fingerprints = Fingerprints()
+        return fingerprints(self.dct)
 
     @property
-    @cache(key=lambda s: hippie_hashing(s.dct))
     def flat(self):
+        if self._tracked_fingerprints() is None:
+            return self._hashed_flat()
+        return self._fingerprinted_flat()
+
+    @cache(key=lambda s: hippie_hashing(s.dct))
+    def _hashed_flat(self):
+        return dict(unclassify(self.dct, join_fun=self.tokenizer.join))
+
+    @cache(key=lambda s: (s.tokenizer.sep, s.tokenizer.quote_char,
+                          s.fingerprint))
+    def _fingerprinted_flat(self):
         return dict(unclassify(self.dct, join_fun=self.tokenizer.join))
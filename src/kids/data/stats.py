@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Opt-in instrumentation of ``kids.data``
+
+Once enabled, ``mdict``, ``dct`` and ``format`` account their work in
+counters and timers:
+
+    >>> from kids.data import stats, mdict
+    >>> stats.enable()
+    >>> mdict.mget({'a': {'b': 1}}, 'a.b')
+    1
+    >>> counters = stats.snapshot()['counters']
+    >>> counters['mdict.tokenize'], counters['mdict.aget.nodes']
+    (1, 2)
+
+A callback can also receive each event as it happens:
+
+    >>> stats.reset()
+    >>> events = []
+    >>> stats.enable(lambda kind, name, value: events.append((kind, name)))
+    >>> mdict.mget({'a': 1}, 'a')
+    1
+    >>> events
+    [('counter', 'mdict.tokenize'), ('counter', 'mdict.aget.nodes')]
+
+    >>> stats.disable()
+    >>> stats.reset()
+
+When disabled (the default), instrumented code only checks ``enabled``.
+
+Counters
+--------
+
+- ``mdict.tokenize``: keys tokenized by ``mget``, ``mset``, ``mdel``,
+  ``mset_many``, ``mdel_many``.
+- ``mdict.aget.nodes``: nodes traversed by ``aget``.
+- ``mdict.select.nodes``: nodes traversed by ``mselect``.
+- ``mdict.views.hits``, ``mdict.views.misses``: cached sub dict views.
+- ``fingerprint.hits``, ``fingerprint.misses``: cached fingerprints of
+  dicts and lists.
+- ``dct.is_dict_like``: calls of ``is_dict_like``.
+- ``dct.multi_dict_reader.layers``: layers queried by ``MultiDictReader``.
+- ``format.compile.hits``, ``format.compile.misses``: reuse of fused
+  ``CompoundFormatter`` chains.
+
+Timers
+------
+
+- ``format.<class name>``: calls of formatters of this class.
+- ``format_many.<class name>``: same for ``format_many``.
+
+Each timer also counts its calls in the counter of the same name.
+
+"""
+
+import timeit
+
+
+enabled = False
+
+counters = {}
+timers = {}
+callbacks = []
+
+clock = timeit.default_timer
+
+
+def enable(callback=None):
+    """Enables instrumentation, ``callback`` receiving all events
+
+    ``callback`` is called with ``kind`` (``"counter"`` or ``"timer"``),
+    ``name``, and the increment or the elapsed seconds.
+
+    """
+    global enabled
+    if callback is not None:
+        callbacks.append(callback)
+    enabled = True
+
+
+def disable():
+    """Disables instrumentation and removes callbacks"""
+    global enabled
+    enabled = False
+    del callbacks[:]
+
+
+def reset():
+    counters.clear()
+    timers.clear()
+
+
+def snapshot():
+    """Returns a copy of current counters and timers"""
+    return {"counters": dict(counters), "timers": dict(timers)}
+
+
+def incr(name, nb=1):
+    counters[name] = counters.get(name, 0) + nb
+    for callback in callbacks:
+        callback("counter", name, nb)
+
+
+def add_time(name, elapsed):
+    counters[name] = counters.get(name, 0) + 1
+    timers[name] = timers.get(name, 0.) + elapsed
+    for callback in callbacks:
+        callback("timer", name, elapsed)
+
+
+class timer(object):
+    """Context manager accounting time spent in its block
+
+        >>> with timer("test"):
+        ...     pass
+        >>> counters["test"], timers["test"] >= 0
+        (1, True)
+        >>> reset()
+
+    """
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        add_time(self.name, clock() - self.start)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""Path-compressed trie of string keys
+
+    >>> t = Trie([('services.web.port', 80), ('services.web.host', 'w'),
+    ...           ('services.db.port', 5432), ('debug', False)])
+    >>> list(t.items('services.web.'))
+    [('services.web.host', 'w'), ('services.web.port', 80)]
+    >>> t.count('services.')
+    3
+    >>> t.longest_prefix('services.web.port.extra')
+    ('services.web.port', 80)
+
+Edges hold strings instead of characters, so that the depth of the trie
+stays small. Each node keeps the number of keys of its subtree.
+
+"""
+
+
+_Null = object()
+
+
+class _Node(object):
+
+    __slots__ = ("children", "value", "size")
+
+    def __init__(self, value=_Null):
+        self.children = {}  ## first char -> (label, node)
+        self.value = value
+        self.size = 0 if value is _Null else 1
+
+
+def _common_size(a, b):
+    size = min(len(a), len(b))
+    i = 0
+    while i < size and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class Trie(object):
+    """Mapping of string keys supporting prefix queries
+
+    Queries cost the length of the prefix, plus the number of results:
+
+        >>> t = Trie()
+        >>> t['abc'] = 1
+        >>> t['abd'] = 2
+        >>> t['b'] = 3
+        >>> sorted(t)
+        ['abc', 'abd', 'b']
+        >>> len(t), t.count('ab'), t.count('abc'), t.count('x')
+        (3, 2, 1, 0)
+        >>> list(t.keys('a'))
+        ['abc', 'abd']
+        >>> del t['abc']
+        >>> list(t.items())
+        [('abd', 2), ('b', 3)]
+        >>> t.delete_prefix('a')
+        1
+        >>> list(t.items()), 'abd' in t
+        ([('b', 3)], False)
+
+    """
+
+    __slots__ = ("root", )
+
+    def __init__(self, items=()):
+        self.root = _Node()
+        for key, value in items:
+            self[key] = value
+
+    def _path(self, key):
+        """Returns list of nodes matching ``key``, or None"""
+        node, i, path = self.root, 0, [self.root]
+        while i < len(key):
+            edge = node.children.get(key[i])
+            if edge is None or not key.startswith(edge[0], i):
+                return None
+            i += len(edge[0])
+            node = edge[1]
+            path.append(node)
+        return path
+
+    def __getitem__(self, key):
+        path = self._path(key)
+        if path is None or path[-1].value is _Null:
+            raise KeyError(key)
+        return path[-1].value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        path = self._path(key)
+        return path is not None and path[-1].value is not _Null
+
+    def __len__(self):
+        return self.root.size
+
+    def __setitem__(self, key, value):
+        node, i, path = self.root, 0, [self.root]
+        while i < len(key):
+            edge = node.children.get(key[i])
+            if edge is None:
+                child = _Node()
+                node.children[key[i]] = (key[i:], child)
+                node = child
+                path.append(node)
+                break
+            label, child = edge
+            size = _common_size(label, key[i:i + len(label)])
+            if size < len(label):  ## split the edge
+                middle = _Node()
+                middle.size = child.size
+                middle.children[label[size]] = (label[size:], child)
+                node.children[key[i]] = (label[:size], middle)
+                child = middle
+            i += size
+            node = child
+            path.append(node)
+        if node.value is _Null:
+            for parent in path:
+                parent.size += 1
+        node.value = value
+
+    def __delitem__(self, key):
+        path = self._path(key)
+        if path is None or path[-1].value is _Null:
+            raise KeyError(key)
+        path[-1].value = _Null
+        self._remove(key, path, 1)
+
+    def _remove(self, key, path, nb):
+        """Updates sizes of ``path`` losing ``nb`` keys, and prunes it"""
+        for node in path:
+            node.size -= nb
+        ## ``labels[i]`` is the label of the edge leading to ``path[i]``
+        labels, i = [None], 0
+        for node in path[:-1]:
+            label = node.children[key[i]][0]
+            labels.append(label)
+            i += len(label)
+        for depth in range(len(path) - 1, 0, -1):
+            node, parent = path[depth], path[depth - 1]
+            first = labels[depth][0]
+            if node.size == 0:
+                del parent.children[first]
+            elif node.value is _Null and len(node.children) == 1:
+                label, child = list(node.children.values())[0]
+                parent.children[first] = (labels[depth] + label, child)
+            else:
+                break
+
+    def _find(self, prefix):
+        """Returns (path, key of last node) of the subtree of ``prefix``"""
+        node, i, path = self.root, 0, [self.root]
+        while i < len(prefix):
+            edge = node.children.get(prefix[i])
+            if edge is None:
+                return None, None
+            label, child = edge
+            if prefix.startswith(label, i):
+                i += len(label)
+            elif label.startswith(prefix[i:]):
+                i += len(label)  ## prefix ends inside this edge
+                prefix = prefix[:i - len(label)] + label
+            else:
+                return None, None
+            node = child
+            path.append(node)
+        return path, prefix
+
+    def count(self, prefix=""):
+        """Returns number of keys starting with ``prefix``"""
+        path, _ = self._find(prefix)
+        return 0 if path is None else path[-1].size
+
+    def items(self, prefix=""):
+        """Yields sorted (key, value) of keys starting with ``prefix``"""
+        path, key = self._find(prefix)
+        if path is None:
+            return
+        stack = [(key, path[-1])]
+        while stack:
+            key, node = stack.pop()
+            if node.value is not _Null:
+                yield key, node.value
+            stack.extend((key + label, child) for _, (label, child)
+                         in sorted(node.children.items(), reverse=True))
+
+    def keys(self, prefix=""):
+        return (key for key, _ in self.items(prefix))
+
+    def __iter__(self):
+        return self.keys()
+
+    def longest_prefix(self, key):
+        """Returns (key, value) of the longest key being a prefix of ``key``
+
+            >>> Trie([('a', 1), ('abc', 2)]).longest_prefix('abd')
+            ('a', 1)
+            >>> Trie([('a', 1)]).longest_prefix('b')
+            Traceback (most recent call last):
+            ...
+            KeyError: 'b'
+
+        """
+        node, i = self.root, 0
+        found = ("", node.value)
+        while i < len(key):
+            edge = node.children.get(key[i])
+            if edge is None or not key.startswith(edge[0], i):
+                break
+            i += len(edge[0])
+            node = edge[1]
+            if node.value is not _Null:
+                found = (key[:i], node.value)
+        if found[1] is _Null:
+            raise KeyError(key)
+        return found
+
+    def delete_prefix(self, prefix):
+        """Deletes all keys starting with ``prefix``, returns their number"""
+        path, key = self._find(prefix)
+        if path is None or len(path) == 1:
+            if path is None or not self.root.size:
+                return 0
+            nb = self.root.size  ## empty prefix
+            self.root = _Node()
+            return nb
+        node, nb = path[-1], path[-1].size
+        node.value = _Null
+        node.children = {}
+        self._remove(key, path, nb)
+        return nb